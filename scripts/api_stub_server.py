@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the invoice-flow API
+Mimics the endpoints the ingestion scripts call so performance experiments
+never touch production:
+
+    GET  /api/payments          list created payments
+    GET  /api/payments/all      list payments; paged with ?updatedSince=&cursor=&limit=
+    GET  /api/invoices          list invoices; paged the same way
+    POST /api/payments          create payment (JSON)
+    PUT  /api/payments/{id}     update / link payment (JSON)
+    POST /api/invoices          upload invoice (multipart)
+    GET  /__stats               request counters for the harness
+
+Latency, error rate and throttling are configurable.
+
+Usage:
+    python api_stub_server.py [--port 8787] [--latency-ms 80] [--jitter-ms 40]
+                              [--error-rate 0.01] [--rate-limit 50]
+
+Then: INVOICE_FLOW_BASE_URL=http://127.0.0.1:8787/api python process_all_invoices.py
+"""
+
+import re
+import json
+import time
+import uuid
+import base64
+import random
+import argparse
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Configuration
+HOST = "127.0.0.1"
+PORT = 8787
+PAYMENT_ID_PATH = re.compile(r'^/api/payments/([^/]+)$')
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 2000
+
+
+def now_iso() -> str:
+    """Timestamp in the format JSON-serialized Prisma DateTimes use"""
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def sync_page(rows: list, query: dict):
+    """Same contract as src/lib/sync-cursor.ts: None if no sync params,
+    else {"data", "nextCursor"} ordered by (updatedAt, id)"""
+    cursor = query.get("cursor", [None])[0]
+    since = query.get("updatedSince", [None])[0]
+    limit = query.get("limit", [None])[0]
+    if cursor is None and since is None and limit is None:
+        return None
+
+    take = min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE)
+    rows = sorted(rows, key=lambda r: (r["updatedAt"], r["id"]))
+    if since is not None:
+        rows = [r for r in rows if r["updatedAt"] >= since]
+    if cursor is not None:
+        position = tuple(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().split("|", 1))
+        rows = [r for r in rows if (r["updatedAt"], r["id"]) > position]
+
+    data = rows[:take]
+    next_cursor = None
+    if len(rows) > take:
+        last = data[-1]
+        next_cursor = base64.urlsafe_b64encode(f"{last['updatedAt']}|{last['id']}".encode()).decode().rstrip("=")
+    return {"data": data, "nextCursor": next_cursor}
+
+
+class TokenBucket:
+    """Requests-per-second throttle; rate <= 0 disables it"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class StubState:
+    """In-memory tables and counters shared by all handler threads"""
+
+    def __init__(self, latency_ms: float, jitter_ms: float, error_rate: float, rate_limit: float):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.bucket = TokenBucket(rate_limit)
+        self.payments = {}
+        self.invoices = {}
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def count(self, key: str):
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def delay(self):
+        latency = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if latency > 0:
+            time.sleep(latency / 1000)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = "InvoiceFlowStub/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _gate(self, route: str) -> bool:
+        """Apply auth, throttling, latency and injected errors; False if answered"""
+        state = self.server.state
+        body = self._read_body()
+        self.body = body
+
+        if not self.headers.get("X-API-Key"):
+            state.count(f"{route} 401")
+            self._send_json(401, {"error": "Unauthorized"})
+            return False
+        if not state.bucket.allow():
+            state.count(f"{route} 429")
+            self._send_json(429, {"error": "Too many requests"})
+            return False
+
+        state.delay()
+
+        if random.random() < state.error_rate:
+            state.count(f"{route} 500")
+            self._send_json(500, {"error": "Injected failure"})
+            return False
+
+        state.count(f"{route} 2xx")
+        return True
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        state = self.server.state
+        if path == "/__stats":
+            with state._lock:
+                self._send_json(200, {
+                    "counts": dict(state.counts),
+                    "payments": len(state.payments),
+                    "invoices": len(state.invoices),
+                })
+            return
+        if path == "/api/payments":
+            if self._gate("GET /api/payments"):
+                with state._lock:
+                    self._send_json(200, list(state.payments.values()))
+            return
+        if path in ("/api/payments/all", "/api/invoices"):
+            if self._gate(f"GET {path}"):
+                query = parse_qs(urlparse(self.path).query)
+                with state._lock:
+                    table = state.payments if path == "/api/payments/all" else state.invoices
+                    rows = list(table.values())
+                page = sync_page(rows, query)
+                self._send_json(200, rows if page is None else page)
+            return
+        self._send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        state = self.server.state
+
+        if path == "/api/payments":
+            if not self._gate("POST /api/payments"):
+                return
+            data = json.loads(self.body or b"{}")
+            if not data.get("amount") or float(data["amount"]) <= 0:
+                self._send_json(400, {"error": "Amount is required and must be positive"})
+                return
+            payment = {
+                "id": uuid.uuid4().hex,
+                "amount": float(data["amount"]),
+                "date": data.get("date"),
+                "notes": data.get("notes"),
+                "invoiceId": None,
+                "companyId": data.get("companyId"),
+                "updatedAt": now_iso(),
+            }
+            with state._lock:
+                state.payments[payment["id"]] = payment
+            self._send_json(201, payment)
+            return
+
+        if path == "/api/invoices":
+            if not self._gate("POST /api/invoices"):
+                return
+            if b'name="file"' not in self.body:
+                self._send_json(400, {"error": "No file provided"})
+                return
+            fields = dict(re.findall(rb'name="(\w+)"\r\n\r\n([^\r]*)\r\n', self.body))
+            invoice = {
+                "id": uuid.uuid4().hex,
+                "size": len(self.body),
+                "invoiceNumber": fields.get(b"invoiceNumber", b"").decode() or None,
+                "invoiceDate": fields.get(b"invoiceDate", b"").decode() or None,
+                "totalAmount": float(fields[b"totalAmount"]) if fields.get(b"totalAmount") else 0,
+                "companyId": fields.get(b"companyId", b"").decode() or None,
+                "updatedAt": now_iso(),
+            }
+            with state._lock:
+                state.invoices[invoice["id"]] = invoice
+            self._send_json(201, invoice)
+            return
+
+        self._send_json(404, {"error": "Not found"})
+
+    def do_PUT(self):
+        path = urlparse(self.path).path
+        state = self.server.state
+        match = PAYMENT_ID_PATH.match(path)
+        if not match:
+            self._send_json(404, {"error": "Not found"})
+            return
+        if not self._gate("PUT /api/payments/{id}"):
+            return
+        data = json.loads(self.body or b"{}")
+        with state._lock:
+            payment = state.payments.get(match.group(1))
+            if payment is None:
+                self._send_json(404, {"error": "Payment not found"})
+                return
+            payment.update({k: v for k, v in data.items() if k in ("amount", "notes", "date", "invoiceId")})
+            payment["updatedAt"] = now_iso()
+            self._send_json(200, payment)
+
+
+def create_server(host: str = HOST, port: int = PORT, latency_ms: float = 80, jitter_ms: float = 40,
+                  error_rate: float = 0.0, rate_limit: float = 0) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.state = StubState(latency_ms, jitter_ms, error_rate, rate_limit)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local invoice-flow API stand-in")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--latency-ms", type=float, default=80)
+    parser.add_argument("--jitter-ms", type=float, default=40)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0, help="Requests/sec, 0 = unlimited")
+    args = parser.parse_args()
+
+    server = create_server(args.host, args.port, args.latency_ms, args.jitter_ms,
+                           args.error_rate, args.rate_limit)
+    print(f"🧪 Stub API on http://{args.host}:{args.port}/api")
+    print(f"   latency {args.latency_ms}±{args.jitter_ms} ms | errors {args.error_rate:.1%} | "
+          f"rate limit {args.rate_limit or 'off'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
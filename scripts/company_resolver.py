@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Resolve extracted recipient names to Company rows
+Builds a trigram inverted index over the company list so a raw line like
+"XYZ SDN BHD Ref:" maps to the best candidate company ids in well under a
+millisecond, without comparing against every company.
+
+Scores are IDF-weighted Dice over trigrams, and generic business words
+(TRADING, ENTERPRISE, ...) are dropped before indexing, so two companies
+don't look alike just because both are "... Trading Sdn Bhd". resolve()
+only picks a company when the best score is high and clearly ahead of the
+runner-up; anything else is left for a human (None).
+
+Companies are read from a JSON export of the Company table (a list of
+objects with at least "id" and "name", e.g. the admin companies API).
+
+Usage:
+    python company_resolver.py companies.json "XYZ SDN. BHD. Ref:" [more names...]
+"""
+
+import re
+import sys
+import json
+import math
+import time
+import heapq
+from collections import defaultdict
+
+# Configuration
+TOP_K = 5
+MIN_SCORE = 0.3
+AUTO_RESOLVE_SCORE = 0.8     # resolve() needs at least this...
+AUTO_RESOLVE_MARGIN = 0.15   # ...and this much over the runner-up
+
+# Legal-form and filler tokens that carry no identity
+LEGAL_SUFFIXES = {
+    "SDN", "BHD", "BERHAD", "SENDIRIAN", "PLT", "LLP", "LTD", "LIMITED",
+    "CO", "INC", "CORP", "M", "THE",
+}
+# Business-type words shared by many unrelated companies (and used by the
+# extractor to spot a company line); dropped unless nothing else is left
+GENERIC_WORDS = {
+    "TRADING", "ENTERPRISE", "ENTERPRISES", "RESOURCES", "INDUSTRIES", "MARKETING",
+    "SERVICES", "SERVICE", "SOLUTIONS", "SOLUTION", "HOLDINGS", "GROUP", "CORPORATION",
+    "COMPANY", "INTERNATIONAL", "GLOBAL",
+}
+TRAILING_REF = re.compile(r'\s*\b(REF|ATTN|TEL|FAX)\b.*$', re.IGNORECASE)
+NON_ALNUM = re.compile(r'[^A-Z0-9&]+')
+
+
+def normalize_name(name: str) -> str:
+    """Upper-case, drop trailing Ref:/Attn:, punctuation, legal suffixes and generic words"""
+    if not name:
+        return ""
+    text = TRAILING_REF.sub("", name.upper())
+    tokens = [t for t in NON_ALNUM.split(text) if t and t not in LEGAL_SUFFIXES]
+    distinctive = [t for t in tokens if t not in GENERIC_WORDS]
+    return " ".join(distinctive or tokens)
+
+
+def trigrams(normalized: str) -> set:
+    """Character trigrams with word-boundary padding"""
+    if not normalized:
+        return set()
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class CompanyIndex:
+    """Trigram inverted index over company names"""
+
+    def __init__(self, companies: list):
+        self.companies = companies
+        self.normalized = []
+        self.postings = defaultdict(list)
+        self.exact = defaultdict(list)
+
+        company_grams = []
+        for idx, company in enumerate(companies):
+            norm = normalize_name(company["name"])
+            grams = trigrams(norm)
+            self.normalized.append(norm)
+            company_grams.append(grams)
+            self.exact[norm].append(idx)
+            for gram in grams:
+                self.postings[gram].append(idx)
+
+        # IDF: trigrams found in many names count for little
+        total = len(companies)
+        self.idf = {gram: math.log((1 + total) / len(ids)) for gram, ids in self.postings.items()}
+        self.unseen_idf = math.log(1 + total)
+        self.weights = [sum(self.idf[g] for g in grams) for grams in company_grams]
+
+    @classmethod
+    def from_json(cls, path: str) -> "CompanyIndex":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def search(self, name: str, k: int = TOP_K, min_score: float = MIN_SCORE) -> list:
+        """Return up to k candidates as dicts with id, name and weighted Dice score"""
+        norm = normalize_name(name)
+        if not norm:
+            return []
+
+        if norm in self.exact:
+            # Several companies can normalise to the same name; all tie at 1.0
+            return [
+                {"id": self.companies[idx]["id"], "name": self.companies[idx]["name"], "score": 1.0}
+                for idx in self.exact[norm][:k]
+            ]
+
+        query = trigrams(norm)
+        shared = defaultdict(float)
+        q = 0.0
+        for gram in query:
+            q += self.idf.get(gram, self.unseen_idf)
+            for idx in self.postings.get(gram, ()):
+                shared[idx] += self.idf[gram]
+
+        # Weighted Dice: only companies sharing at least one trigram are scored
+        scored = (
+            (2.0 * hits / (q + self.weights[idx]), idx)
+            for idx, hits in shared.items() if hits
+        )
+        best = heapq.nlargest(k, (s for s in scored if s[0] >= min_score))
+        return [
+            {"id": self.companies[idx]["id"], "name": self.companies[idx]["name"], "score": round(score, 3)}
+            for score, idx in best
+        ]
+
+    def resolve(self, name: str, min_score: float = AUTO_RESOLVE_SCORE,
+                margin: float = AUTO_RESOLVE_MARGIN):
+        """Company id when the best match is confident and unambiguous, else None"""
+        candidates = self.search(name, k=2, min_score=MIN_SCORE)
+        if not candidates or candidates[0]["score"] < min_score:
+            return None
+        if len(candidates) > 1 and candidates[0]["score"] - candidates[1]["score"] < margin:
+            return None
+        return candidates[0]["id"]
+
+
+def main():
+    if len(sys.argv) < 3:
+        print(__doc__)
+        return
+
+    index = CompanyIndex.from_json(sys.argv[1])
+    print(f"🏢 Indexed {len(index.companies)} companies ({len(index.postings)} trigrams)")
+
+    for name in sys.argv[2:]:
+        start = time.perf_counter()
+        candidates = index.search(name)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        print(f"\n🔍 {name!r} → {normalize_name(name)!r} ({elapsed_ms:.3f} ms)")
+        if not candidates:
+            print("   ❌ No candidates")
+        for c in candidates:
+            print(f"   {c['score']:.3f}  {c['name']}  [{c['id']}]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,502 @@
+#!/usr/bin/env python3
+"""
+Distributed invoice processing with a lease-based work manifest.
+
+The coordinator writes every PDF from the configured folders into a SQLite
+manifest on shared storage. Any number of workers (processes or machines)
+then claim files with time-limited leases, heartbeat while they work, and
+hand expired leases back to the queue.
+
+Each ingestion step (payment -> invoice upload -> link) is checkpointed in
+the manifest, so a requeued file resumes after the last finished step
+instead of creating a second payment. A step that was started but never
+checkpointed (worker died mid-request) is parked as "review" rather than
+retried blindly.
+
+Workers share the duplicate index with process_all_invoices.py
+(invoice_dedup.py): exact copies are skipped before extraction, and
+near-duplicates are checked and recorded in one transaction just before
+the payment, so two workers holding copies of one invoice can't both
+ingest it. Put the index next to the manifest (--dedup-index).
+
+Usage:
+    python distributed_process.py init   [--manifest PATH] [FOLDER ...]
+    python distributed_process.py work   [--manifest PATH] [--workers N] [--dedup-index PATH]
+    python distributed_process.py status [--manifest PATH]
+    python distributed_process.py requeue-review [--manifest PATH]
+    python distributed_process.py requeue-review --path PDF [--payment-id ID] [--invoice-id ID]
+
+After a manual check of a "review" item, pass the payment/invoice ids that
+did reach the API (if any) so the retry resumes after them instead of
+creating a second payment.
+
+The manifest must live on storage with working POSIX locks (local disk,
+NFSv4, EFS/Filestore) because SQLite relies on them for the claim step.
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import argparse
+import threading
+import multiprocessing
+from pathlib import Path
+
+# Configuration
+MANIFEST_PATH = os.environ.get("INVOICE_MANIFEST", "/tmp/invoice_manifest.sqlite")
+LEASE_SECONDS = 120
+HEARTBEAT_SECONDS = 30
+MAX_ATTEMPTS = 3
+IDLE_POLL_SECONDS = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS work_items (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    path          TEXT NOT NULL UNIQUE,
+    folder        TEXT NOT NULL,
+    status        TEXT NOT NULL DEFAULT 'pending',
+    step          TEXT,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    lease_owner   TEXT,
+    lease_token   TEXT,
+    lease_expires REAL,
+    invoice_data  TEXT,
+    payment_id    TEXT,
+    invoice_id    TEXT,
+    result        TEXT,
+    error         TEXT,
+    updated_at    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_work_items_status ON work_items(status, lease_expires);
+"""
+
+
+def connect(manifest_path: str) -> sqlite3.Connection:
+    """Open the manifest with settings that tolerate many concurrent workers"""
+    # The heartbeat thread shares the connection; Lease serialises its writes
+    conn = sqlite3.connect(manifest_path, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA busy_timeout = 30000")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+# =============================================================================
+# Coordinator
+# =============================================================================
+
+def enqueue_folders(manifest_path: str, folders: list) -> int:
+    """Add every PDF in the folders to the manifest (existing paths are kept)
+
+    Paths are stored absolute so workers started elsewhere can open them;
+    the folders must be mounted at the same path on every node.
+    """
+    conn = connect(manifest_path)
+    now = time.time()
+    added = 0
+
+    conn.execute("BEGIN IMMEDIATE")
+    for folder in folders:
+        if not os.path.exists(folder):
+            print(f"❌ Folder not found: {folder}")
+            continue
+        pdf_files = sorted(Path(folder).glob('*.pdf'))
+        for pdf_path in pdf_files:
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO work_items (path, folder, updated_at) VALUES (?, ?, ?)",
+                (os.path.abspath(pdf_path), Path(folder).name, now),
+            )
+            added += cur.rowcount
+        print(f"📂 {Path(folder).name}: {len(pdf_files)} PDFs")
+    conn.execute("COMMIT")
+    conn.close()
+    return added
+
+
+def manifest_status(manifest_path: str) -> dict:
+    """Count work items by status, splitting out expired leases"""
+    conn = connect(manifest_path)
+    counts = {}
+    for row in conn.execute("SELECT status, COUNT(*) AS n FROM work_items GROUP BY status"):
+        counts[row["status"]] = row["n"]
+    expired = conn.execute(
+        "SELECT COUNT(*) FROM work_items WHERE status = 'leased' AND lease_expires < ?",
+        (time.time(),),
+    ).fetchone()[0]
+    conn.close()
+    counts["expired_leases"] = expired
+    return counts
+
+
+def requeue_review(manifest_path: str, path: str = None, payment_id: str = None,
+                   invoice_id: str = None) -> int:
+    """Send items parked for review back to the queue after a manual check
+
+    The interrupted "start:*" step is rolled back to the last checkpoint.
+    payment_id / invoice_id found during the check (one item, by path) are
+    recorded first so the retry skips the steps that already happened.
+    """
+    if (payment_id or invoice_id) and not path:
+        raise ValueError("--payment-id/--invoice-id need --path to pick the item")
+
+    conn = connect(manifest_path)
+    conn.execute("BEGIN IMMEDIATE")
+    query = "SELECT * FROM work_items WHERE status = 'review'"
+    params = ()
+    if path:
+        query += " AND path = ?"
+        params = (os.path.abspath(path),)
+    rows = conn.execute(query, params).fetchall()
+
+    for row in rows:
+        item_payment = payment_id or row["payment_id"]
+        item_invoice = invoice_id or row["invoice_id"]
+        if item_invoice and item_payment:
+            step = "uploaded"
+        elif item_payment:
+            step = "payment"
+        elif row["invoice_data"]:
+            step = "extracted"
+        else:
+            step = None
+        conn.execute(
+            "UPDATE work_items SET status = 'pending', step = ?, attempts = 0, error = NULL, "
+            "payment_id = ?, invoice_id = ?, updated_at = ? WHERE id = ?",
+            (step, item_payment, item_invoice, time.time(), row["id"]),
+        )
+    conn.execute("COMMIT")
+    conn.close()
+    return len(rows)
+
+
+# =============================================================================
+# Leases
+# =============================================================================
+
+class Lease:
+    """A claimed work item plus the fencing token that proves ownership"""
+
+    def __init__(self, conn: sqlite3.Connection, row: sqlite3.Row, token: str):
+        self.conn = conn
+        self.id = row["id"]
+        self.path = row["path"]
+        self.folder = row["folder"]
+        self.step = row["step"]
+        self.attempts = row["attempts"] + 1
+        self.payment_id = row["payment_id"]
+        self.invoice_id = row["invoice_id"]
+        self.invoice_data = json.loads(row["invoice_data"]) if row["invoice_data"] else None
+        self.token = token
+        self.lost = threading.Event()
+        self._lock = threading.Lock()
+
+    def update(self, **fields) -> bool:
+        """Write fields only while we still hold the lease"""
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{k} = ?" for k in fields)
+        with self._lock:
+            cur = self.conn.execute(
+                f"UPDATE work_items SET {assignments} WHERE id = ? AND lease_token = ?",
+                (*fields.values(), self.id, self.token),
+            )
+        if cur.rowcount == 0:
+            self.lost.set()
+            return False
+        return True
+
+    def heartbeat(self) -> bool:
+        return self.update(lease_expires=time.time() + LEASE_SECONDS)
+
+    def retry_later(self, error: str) -> bool:
+        """Give the item back to the queue, or fail it once attempts run out"""
+        status = "pending" if self.attempts < MAX_ATTEMPTS else "failed"
+        return self.finish(status, error=error)
+
+    def finish(self, status: str, result: dict = None, error: str = None) -> bool:
+        return self.update(
+            status=status,
+            result=json.dumps(result) if result else None,
+            error=error,
+            lease_owner=None,
+            lease_token=None,
+            lease_expires=None,
+        )
+
+
+def claim(conn: sqlite3.Connection, worker_id: str):
+    """Claim the next pending (or expired) item, or return None when drained"""
+    now = time.time()
+    token = uuid.uuid4().hex
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Expired leases that already used up their attempts are failed for good
+        conn.execute(
+            "UPDATE work_items SET status = 'failed', error = 'lease expired too many times', "
+            "lease_owner = NULL, lease_token = NULL, lease_expires = NULL, updated_at = ? "
+            "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+            (now, now, MAX_ATTEMPTS),
+        )
+        row = conn.execute(
+            "SELECT * FROM work_items "
+            "WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?) "
+            "ORDER BY id LIMIT 1",
+            (now,),
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute(
+            "UPDATE work_items SET status = 'leased', attempts = attempts + 1, "
+            "lease_owner = ?, lease_token = ?, lease_expires = ?, updated_at = ? WHERE id = ?",
+            (worker_id, token, now + LEASE_SECONDS, now, row["id"]),
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+    return Lease(conn, row, token)
+
+
+def has_live_work(conn: sqlite3.Connection) -> bool:
+    """True while other workers still hold unexpired leases (they may expire later)"""
+    row = conn.execute(
+        "SELECT COUNT(*) FROM work_items WHERE status = 'leased' AND lease_expires >= ?",
+        (time.time(),),
+    ).fetchone()
+    return row[0] > 0
+
+
+def _heartbeat_loop(lease: Lease, stop: threading.Event):
+    while not stop.wait(HEARTBEAT_SECONDS):
+        if not lease.heartbeat():
+            print(f"      ⚠️ Lease lost on {Path(lease.path).name}")
+            return
+
+
+# =============================================================================
+# Worker
+# =============================================================================
+
+def process_leased_item(lease: Lease, dedup_index=None) -> None:
+    """Run the ingestion steps for one file, checkpointing after each"""
+    from document_handle import DocumentHandle
+
+    name = Path(lease.path).name
+
+    # A step that started but never checkpointed may have reached the API;
+    # retrying it could double-ingest, so park it for a human instead.
+    if lease.step and lease.step.startswith("start:"):
+        lease.finish("review", error=f"interrupted during {lease.step[6:]}")
+        print(f"      ⚠️ {name}: interrupted during {lease.step[6:]}, parked for review")
+        return
+
+    # Read once; extraction and upload share the buffer
+    with DocumentHandle.open(lease.path) as document:
+        _ingest_leased_item(lease, document, name, dedup_index)
+
+
+def _finish_duplicate(lease: Lease, name: str, duplicate: dict) -> None:
+    lease.finish("duplicate", result={
+        "file": name,
+        "status": "duplicate",
+        "reason": duplicate["reason"],
+        "duplicate_of": duplicate["path"],
+    })
+    print(f"      🔁 {name}: duplicate of {duplicate['path']} ({duplicate['reason']})")
+
+
+def _ingest_leased_item(lease: Lease, document, name: str, dedup_index=None) -> None:
+    # Imported here so `init`/`status` work on machines without pdfplumber
+    from process_all_invoices import (
+        read_pdf_text, extract_invoice_data, create_payment, upload_invoice, link_payment_to_invoice,
+    )
+    from invoice_dedup import minhash
+
+    # A hit on our own path is this item's entry from an earlier attempt
+    # (e.g. a review item that was requeued), not another copy
+    content_hash = document.sha256 if dedup_index else None
+    if dedup_index and lease.payment_id is None:
+        duplicate = dedup_index.find_by_hash(content_hash)
+        if duplicate and duplicate["path"] != lease.path:
+            _finish_duplicate(lease, name, duplicate)
+            return
+
+    text = ""
+    invoice_data = lease.invoice_data
+    if invoice_data is None:
+        text = read_pdf_text(document.stream())
+        invoice_data = extract_invoice_data(lease.path, text)
+        if not invoice_data["total_amount"]:
+            lease.finish("skipped", error="no amount")
+            print(f"      ⚠️ {name}: skipped - no amount extracted")
+            return
+        if not lease.update(invoice_data=json.dumps(invoice_data), step="extracted"):
+            return
+
+    payment_id = lease.payment_id
+    if payment_id is None:
+        # Checked and recorded in one step so a concurrent copy can't slip in.
+        # A resumed item has no text (only invoice_data is checkpointed), so
+        # it is checked by hash and invoice number/amount only.
+        doc_id = None
+        if dedup_index:
+            duplicate, doc_id = dedup_index.add_if_new(
+                lease.path, content_hash, invoice_data, text, signature=minhash(text) if text else None,
+            )
+            if duplicate and duplicate["path"] != lease.path:
+                _finish_duplicate(lease, name, duplicate)
+                return
+        if not lease.update(step="start:payment"):
+            if doc_id:
+                dedup_index.remove(doc_id)
+            return
+        payment = create_payment(
+            invoice_data["total_amount"],
+            invoice_data["invoice_date"],
+            f"Payment for {invoice_data['invoice_number'] or name}",
+        )
+        if not payment:
+            # Nothing was created; the retry must not look like a duplicate
+            if doc_id:
+                dedup_index.remove(doc_id)
+            lease.update(step="extracted")
+            lease.retry_later("payment creation failed")
+            return
+        payment_id = payment["id"]
+        if not lease.update(payment_id=payment_id, step="payment"):
+            return
+
+    invoice_id = lease.invoice_id
+    if invoice_id is None:
+        if not lease.update(step="start:upload"):
+            return
+        invoice = upload_invoice(lease.path, invoice_data, document)
+        if not invoice:
+            # Payment exists; keep it so the retry resumes at the upload step
+            lease.update(step="payment")
+            lease.retry_later("invoice upload failed")
+            return
+        invoice_id = invoice["id"]
+        if not lease.update(invoice_id=invoice_id, step="uploaded"):
+            return
+
+    # Linking is idempotent, so it is safe to repeat after an interruption
+    if not link_payment_to_invoice(payment_id, invoice_id):
+        lease.retry_later("linking failed")
+        return
+
+    lease.finish("success", result={
+        "file": name,
+        "status": "success",
+        "invoice_number": invoice_data["invoice_number"],
+        "invoice_date": invoice_data["invoice_date"],
+        "amount": invoice_data["total_amount"],
+        "recipient": invoice_data["recipient_name"],
+        "payment_id": payment_id,
+        "invoice_id": invoice_id,
+    })
+    print(f"      ✅ {name}: matched ({invoice_data['invoice_number']})")
+
+
+def run_worker(manifest_path: str, worker_id: str = None, dedup_path: str = None) -> int:
+    """Claim and process items until the manifest is drained"""
+    from invoice_dedup import DedupIndex, DEDUP_INDEX
+
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    conn = connect(manifest_path)
+    dedup_index = DedupIndex(dedup_path or DEDUP_INDEX)
+    processed = 0
+
+    while True:
+        lease = claim(conn, worker_id)
+        if lease is None:
+            if has_live_work(conn):
+                # Another worker may die and leave an expiring lease behind
+                time.sleep(IDLE_POLL_SECONDS)
+                continue
+            break
+
+        print(f"[{worker_id}] {Path(lease.path).name}")
+        stop = threading.Event()
+        beater = threading.Thread(target=_heartbeat_loop, args=(lease, stop), daemon=True)
+        beater.start()
+        try:
+            process_leased_item(lease, dedup_index)
+        except Exception as e:
+            lease.retry_later(str(e))
+            print(f"      ❌ {Path(lease.path).name}: {e}")
+        finally:
+            stop.set()
+            beater.join()
+        processed += 1
+
+    dedup_index.close()
+    conn.close()
+    return processed
+
+
+def run_local_workers(manifest_path: str, workers: int, dedup_path: str = None) -> None:
+    """Start several workers on this machine against the same manifest"""
+    procs = [
+        multiprocessing.Process(target=run_worker,
+                                args=(manifest_path, f"{socket.gethostname()}:w{i}", dedup_path))
+        for i in range(workers)
+    ]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+
+
+def main():
+    # process_all_invoices lives next to this script
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    parser = argparse.ArgumentParser(description="Lease-based distributed invoice processing")
+    parser.add_argument("command", choices=["init", "work", "status", "requeue-review"])
+    parser.add_argument("folders", nargs="*", help="Folders to enqueue (init only)")
+    parser.add_argument("--manifest", default=MANIFEST_PATH)
+    parser.add_argument("--workers", type=int, default=1, help="Local worker processes")
+    parser.add_argument("--dedup-index", help="Duplicate index shared with process_all_invoices (work only)")
+    parser.add_argument("--path", help="Review item to requeue (requeue-review only)")
+    parser.add_argument("--payment-id", help="Payment found during the manual check (requeue-review only)")
+    parser.add_argument("--invoice-id", help="Invoice found during the manual check (requeue-review only)")
+    # Intermixed so options may follow the folder list
+    args = parser.parse_intermixed_args()
+
+    if args.command == "init":
+        folders = args.folders
+        if not folders:
+            from process_all_invoices import FOLDERS
+            folders = FOLDERS
+        added = enqueue_folders(args.manifest, folders)
+        print(f"\n📋 Enqueued {added} new files in {args.manifest}")
+
+    elif args.command == "work":
+        start = time.time()
+        if args.workers > 1:
+            run_local_workers(args.manifest, args.workers, args.dedup_index)
+        else:
+            run_worker(args.manifest, dedup_path=args.dedup_index)
+        print(f"\n⏱️  Finished in {time.time() - start:.1f}s")
+        print(json.dumps(manifest_status(args.manifest), indent=2))
+
+    elif args.command == "status":
+        print(json.dumps(manifest_status(args.manifest), indent=2))
+
+    elif args.command == "requeue-review":
+        try:
+            requeued = requeue_review(args.manifest, args.path, args.payment_id, args.invoice_id)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"🔁 Requeued {requeued} items")
+
+
+if __name__ == "__main__":
+    main()
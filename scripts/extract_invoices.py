@@ -5,31 +5,47 @@ Uses Google Vision API for images and pdf text extraction for PDFs
 Extracts: Recipient Name, Total Amount, Invoice Number, Invoice Date
 """
 
+import io
 import os
 import re
 import json
+import time
 import base64
+import argparse
 import requests
 from pathlib import Path
 from datetime import datetime
 import csv
 
+from scan_manifest import ScanManifest, SCAN_MANIFEST
+
 # Configuration
 OMNI_2025_FOLDER = "/Users/waikiengoh/Downloads/OMNI 2025"
 GOOGLE_CLOUD_API_KEY = os.environ.get("GOOGLE_CLOUD_API_KEY", "")
 OUTPUT_CSV = "/tmp/omni_2025_invoices.csv"
 OUTPUT_JSON = "/tmp/omni_2025_invoices.json"
+VISION_TIMEOUT_SECONDS = 60
+
+
+def extract_text_from_pdf(source, page_times: list = None) -> str:
+    """Extract text from PDF using pdfplumber or PyPDF2
 
+    `source` is a file path or the raw PDF bytes. When `page_times` is given,
+    the seconds spent on each page are appended to it.
+    """
+    def open_source():
+        return io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
 
-def extract_text_from_pdf(pdf_path: str) -> str:
-    """Extract text from PDF using pdfplumber or PyPDF2"""
     try:
         # Try pdfplumber first (better for structured PDFs)
         import pdfplumber
-        with pdfplumber.open(pdf_path) as pdf:
+        with pdfplumber.open(open_source()) as pdf:
             text = ""
             for page in pdf.pages:
+                page_start = time.perf_counter()
                 page_text = page.extract_text()
+                if page_times is not None:
+                    page_times.append(time.perf_counter() - page_start)
                 if page_text:
                     text += page_text + "\n"
             return text
@@ -39,7 +55,9 @@ def extract_text_from_pdf(pdf_path: str) -> str:
     try:
         # Fallback to PyPDF2
         import PyPDF2
-        with open(pdf_path, 'rb') as f:
+        stream = open_source()
+        f = open(stream, 'rb') if isinstance(stream, str) else stream
+        with f:
             reader = PyPDF2.PdfReader(f)
             text = ""
             for page in reader.pages:
@@ -50,11 +68,13 @@ def extract_text_from_pdf(pdf_path: str) -> str:
     
     try:
         # Fallback to pdf2image + Vision API for scanned PDFs
-        from pdf2image import convert_from_path
-        images = convert_from_path(pdf_path, first_page=1, last_page=1)
+        from pdf2image import convert_from_path, convert_from_bytes
+        if isinstance(source, (bytes, bytearray)):
+            images = convert_from_bytes(bytes(source), first_page=1, last_page=1)
+        else:
+            images = convert_from_path(source, first_page=1, last_page=1)
         if images:
             # Convert PIL Image to bytes
-            import io
             img_byte_arr = io.BytesIO()
             images[0].save(img_byte_arr, format='PNG')
             img_bytes = img_byte_arr.getvalue()
@@ -82,7 +102,7 @@ def extract_text_with_vision(image_bytes: bytes) -> str:
     }
     
     try:
-        response = requests.post(url, json=payload)
+        response = requests.post(url, json=payload, timeout=VISION_TIMEOUT_SECONDS)
         data = response.json()
         
         if 'responses' in data and data['responses']:
@@ -237,20 +257,38 @@ def parse_invoice_text(text: str, filename: str) -> dict:
     return result
 
 
-def process_invoices(folder_path: str) -> list:
-    """Process all PDF files in the folder"""
+def process_invoices(folder_path: str, manifest=None, retry_quarantined: bool = False) -> list:
+    """Process all PDF files in the folder
+
+    With a ScanManifest only new or modified files are extracted; the others
+    reuse the result stored on their last run. Files quarantined on an earlier
+    run are skipped until they change, unless retry_quarantined is set.
+    """
+    from extraction_sandbox import SandboxedExtractor
+    
     results = []
     folder = Path(folder_path)
     
-    pdf_files = sorted(folder.glob('*.pdf'))
-    print(f"📂 Found {len(pdf_files)} PDF files in {folder_path}")
+    cached = {}
+    if manifest is not None:
+        scan = manifest.scan(folder_path)
+        pdf_files = [Path(p) for p in scan.pending]
+        cached = manifest.results(scan.unchanged + [new for _old, new in scan.renamed])
+        print(f"📂 {scan.total} PDF files in {folder_path}: {scan.describe()}")
+    else:
+        pdf_files = sorted(folder.glob('*.pdf'))
+        print(f"📂 Found {len(pdf_files)} PDF files in {folder_path}")
     print()
     
+    # Each PDF is extracted in a worker with a time/memory budget so one
+    # pathological file can't stall the batch
+    extractor = SandboxedExtractor(retry_quarantined=retry_quarantined)
+    
     for i, pdf_path in enumerate(pdf_files, 1):
         print(f"[{i}/{len(pdf_files)}] Processing {pdf_path.name}...")
         
-        # Extract text
-        text = extract_text_from_pdf(str(pdf_path))
+        # Extract text ("" for quarantined files; the filename fallback still applies)
+        text = extractor.extract_text(str(pdf_path))
         
         # Parse invoice data
         invoice_data = parse_invoice_text(text, pdf_path.name)
@@ -263,6 +301,26 @@ def process_invoices(folder_path: str) -> list:
         print()
         
         results.append(invoice_data)
+        # Quarantined files stay pending; the quarantine list skips them cheaply
+        if manifest is not None and not extractor.is_quarantined(str(pdf_path)):
+            manifest.record(pdf_path, invoice_data)
+    
+    extractor.close()
+    if extractor.quarantined:
+        print(f"🚫 Quarantined {len(extractor.quarantined)} files:")
+        for entry in extractor.quarantined:
+            print(f"   {os.path.basename(entry['path'])}: {entry['reason']}")
+        print()
+    if extractor.skipped:
+        print(f"🚫 Skipped {len(extractor.skipped)} files quarantined on earlier runs (--retry-quarantined to retry)")
+        print()
+    
+    if cached:
+        for path, invoice_data in cached.items():
+            # A renamed file keeps its data under the new name
+            invoice_data["filename"] = os.path.basename(path)
+            results.append(invoice_data)
+        results.sort(key=lambda r: r["filename"])
     
     return results
 
@@ -293,7 +351,9 @@ def print_summary(results: list):
     print(f"{'Invoice #':<15} {'Date':<12} {'Amount':>15} {'Recipient':<50}")
     print("-" * 100)
     
+    # Single pass: totals and field coverage together
     total = 0
+    with_amount = with_date = with_recipient = 0
     for r in results:
         inv_num = r['invoice_number'] or 'N/A'
         date = r['invoice_date'] or 'N/A'
@@ -304,22 +364,27 @@ def print_summary(results: list):
         
         if r['total_amount']:
             total += r['total_amount']
+            with_amount += 1
+        if r['invoice_date']:
+            with_date += 1
+        if r['recipient_name']:
+            with_recipient += 1
     
     print("-" * 100)
     print(f"{'TOTAL':<15} {'':<12} {'RM {:,.2f}'.format(total):>15}")
     print(f"\n📊 Processed: {len(results)} invoices")
     
-    # Count extracted fields
-    with_amount = sum(1 for r in results if r['total_amount'])
-    with_date = sum(1 for r in results if r['invoice_date'])
-    with_recipient = sum(1 for r in results if r['recipient_name'])
-    
     print(f"   ✅ With Amount: {with_amount}/{len(results)}")
     print(f"   ✅ With Date: {with_date}/{len(results)}")
     print(f"   ✅ With Recipient: {with_recipient}/{len(results)}")
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Extract invoice data from PDFs")
+    parser.add_argument("--full", action="store_true", help="Re-extract every file, not just new or modified ones")
+    parser.add_argument("--retry-quarantined", action="store_true", help="Try files quarantined on earlier runs again")
+    args = parser.parse_args()
+    
     print("🔍 INVOICE DATA EXTRACTOR")
     print("=" * 50)
     print()
@@ -329,8 +394,12 @@ def main():
         print(f"❌ Folder not found: {OMNI_2025_FOLDER}")
         return
     
-    # Process invoices
-    results = process_invoices(OMNI_2025_FOLDER)
+    # Process invoices (unchanged files come from the scan manifest)
+    manifest = ScanManifest(SCAN_MANIFEST, scope="extract")
+    if args.full:
+        manifest.forget(OMNI_2025_FOLDER)
+    results = process_invoices(OMNI_2025_FOLDER, manifest, args.retry_quarantined)
+    manifest.close()
     
     # Print summary
     print_summary(results)
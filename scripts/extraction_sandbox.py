@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Per-document time and memory budget for PDF extraction
+Runs extract_text_from_pdf in a separate worker process. A document that
+exceeds its time budget gets the worker killed (and a fresh one started);
+one that exceeds the memory limit fails inside the worker. Either way the
+file goes on a quarantine list with the reason and the batch carries on.
+
+Files slower than SLOW_SECONDS are logged with a per-page profile.
+
+Quarantined files are skipped on later runs until their size or mtime
+changes; pass retry_quarantined=True (--retry-quarantined) to try them again.
+Where no memory limit can be set (e.g. RLIMIT_AS on macOS) only the time
+budget applies; if the worker can't start at all, batch extraction runs
+in-process without a budget rather than stopping. Long-running callers (the
+extraction service) pass fallback_in_process=False to get the startup error
+instead and retry the start on the next document.
+
+Usage:
+    python extraction_sandbox.py [--retry-quarantined] FILE.pdf [FILE.pdf ...]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows: time budget only
+    resource = None
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Configuration
+TIME_BUDGET_SECONDS = float(os.environ.get("EXTRACT_TIME_BUDGET", "60"))
+MEMORY_LIMIT_MB = int(os.environ.get("EXTRACT_MEMORY_LIMIT_MB", "1024"))
+SLOW_SECONDS = 5.0
+STARTUP_TIMEOUT_SECONDS = 60
+QUARANTINE_FILE = os.environ.get("EXTRACT_QUARANTINE_FILE", "/tmp/invoice_quarantine.json")
+
+
+def _worker_main(conn, memory_limit_mb: int):
+    """Worker loop: receive a path or PDF bytes, send back (status, text or error, profile)"""
+    memory_limited = False
+    if resource and memory_limit_mb:
+        limit = memory_limit_mb * 1024 * 1024
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+            memory_limited = True
+        except (ValueError, OSError):
+            # Not supported here (macOS) or above the hard limit: time budget only
+            pass
+
+    from extract_invoices import extract_text_from_pdf
+    # Imports are done; the parent starts timing documents from here
+    conn.send(("ready", memory_limited))
+
+    while True:
+        try:
+            source = conn.recv()
+        except EOFError:
+            return
+        if source is None:
+            return
+
+        page_times = []
+        start = time.perf_counter()
+        try:
+            text = extract_text_from_pdf(source, page_times=page_times)
+            conn.send(("ok", text, {"seconds": time.perf_counter() - start, "page_seconds": page_times}))
+        except MemoryError:
+            conn.send(("quarantine", f"memory limit ({memory_limit_mb} MB) exceeded",
+                       {"seconds": time.perf_counter() - start, "page_seconds": page_times}))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}",
+                       {"seconds": time.perf_counter() - start, "page_seconds": page_times}))
+
+
+class SandboxedExtractor:
+    """Reusable worker process with a per-document time and memory budget"""
+
+    def __init__(self, time_budget: float = TIME_BUDGET_SECONDS, memory_limit_mb: int = MEMORY_LIMIT_MB,
+                 quarantine_file: str = QUARANTINE_FILE, retry_quarantined: bool = False,
+                 fallback_in_process: bool = True):
+        self.time_budget = time_budget
+        self.memory_limit_mb = memory_limit_mb
+        self.quarantine_file = quarantine_file
+        self.retry_quarantined = retry_quarantined
+        self.fallback_in_process = fallback_in_process
+        self.quarantined = []       # quarantined during this run
+        self.skipped = []           # already quarantined on an earlier run, not retried
+        self.process = None
+        self.conn = None
+        self.unsandboxed = False
+        self._known = self._load_quarantine()
+
+    def _load_quarantine(self) -> dict:
+        if not self.quarantine_file or not os.path.exists(self.quarantine_file):
+            return {}
+        with open(self.quarantine_file, encoding="utf-8") as f:
+            return {entry["path"]: entry for entry in json.load(f)}
+
+    def _save_quarantine(self):
+        if not self.quarantine_file:
+            return
+        with open(self.quarantine_file, "w", encoding="utf-8") as f:
+            json.dump(list(self._known.values()), f, indent=2)
+
+    def is_quarantined(self, pdf_path: str) -> bool:
+        """True if the file is on the quarantine list and hasn't changed since"""
+        entry = self._known.get(pdf_path)
+        if entry is None:
+            return False
+        try:
+            st = os.stat(pdf_path)
+        except OSError:
+            return False
+        return entry.get("size_bytes") == st.st_size and entry.get("mtime_ns") == st.st_mtime_ns
+
+    def _start(self):
+        parent, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=_worker_main, args=(child, self.memory_limit_mb), daemon=True
+        )
+        self.process.start()
+        child.close()
+        self.conn = parent
+        # Worker startup (imports) doesn't count against the first document
+        try:
+            if not parent.poll(STARTUP_TIMEOUT_SECONDS):
+                raise RuntimeError(f"no response within {STARTUP_TIMEOUT_SECONDS}s")
+            _ready, memory_limited = parent.recv()
+        except (EOFError, OSError, RuntimeError) as e:
+            self.process.join(timeout=1)
+            exitcode = self.process.exitcode
+            self._kill()
+            reason = str(e) if isinstance(e, RuntimeError) else f"exit code {exitcode}"
+            raise RuntimeError(f"extraction worker failed to start ({reason})")
+        if self.memory_limit_mb and not memory_limited:
+            print(f"   ⚠️ Memory limit unavailable on this platform; time budget only")
+            self.memory_limit_mb = 0
+
+    def _kill(self):
+        if self.process is not None:
+            self.process.kill()
+            self.process.join()
+        if self.conn is not None:
+            self.conn.close()
+        self.process = None
+        self.conn = None
+
+    def warm(self):
+        """Start the worker ahead of the first document
+
+        If it can't start, either fall back to in-process extraction for good
+        or (fallback_in_process=False) raise RuntimeError; the next call tries again.
+        """
+        if not self.unsandboxed and (self.process is None or not self.process.is_alive()):
+            try:
+                self._start()
+            except RuntimeError as e:
+                if not self.fallback_in_process:
+                    raise
+                print(f"   ⚠️ {e}; extracting in-process without a time/memory budget")
+                self.unsandboxed = True
+
+    def run(self, source, name: str = None) -> tuple:
+        """Extract one PDF (path or bytes) within the budget; no quarantine bookkeeping
+
+        Returns (status, text or reason): status is "ok", "timeout", "crash",
+        "quarantine" (memory limit) or "error". Raises RuntimeError if the
+        worker can't start and fallback_in_process is off.
+        """
+        name = name or (source if isinstance(source, str) else "upload")
+        size = len(source) if isinstance(source, (bytes, bytearray)) else (
+            os.path.getsize(source) if os.path.exists(source) else 0)
+
+        self.warm()
+        if self.unsandboxed:
+            from extract_invoices import extract_text_from_pdf
+            try:
+                return "ok", extract_text_from_pdf(source)
+            except Exception as e:
+                return "error", f"{type(e).__name__}: {e}"
+
+        start = time.perf_counter()
+        self.conn.send(source)
+
+        if not self.conn.poll(self.time_budget):
+            self._kill()
+            return "timeout", f"timed out after {self.time_budget:g}s"
+
+        try:
+            status, payload, profile = self.conn.recv()
+        except EOFError:
+            # The worker died mid-document (hard crash or OOM kill)
+            exitcode = self.process.exitcode if self.process else None
+            self._kill()
+            return "crash", f"worker crashed (exit code {exitcode})"
+
+        elapsed = time.perf_counter() - start
+        if elapsed >= SLOW_SECONDS:
+            self._log_slow(name, size, elapsed, profile)
+
+        if status == "quarantine":
+            # Memory pressure can leave the worker in a bad state; start clean
+            self._kill()
+        return status, payload
+
+    def extract_text(self, pdf_path: str) -> str:
+        """Text of the PDF, or "" if it failed or was quarantined"""
+        if not self.retry_quarantined and self.is_quarantined(pdf_path):
+            self.skipped.append(pdf_path)
+            print(f"   🚫 Skipped {os.path.basename(pdf_path)}: quarantined earlier "
+                  f"({self._known[pdf_path]['reason']})")
+            return ""
+
+        status, payload = self.run(pdf_path)
+        if status in ("timeout", "crash", "quarantine"):
+            self._quarantine(pdf_path, payload)
+            return ""
+        if self._known.pop(pdf_path, None) is not None:
+            # Retried (or changed) and now within budget: off the list
+            self._save_quarantine()
+        if status == "ok":
+            return payload
+        print(f"   ⚠️ Extraction error: {payload}")
+        return ""
+
+    def _log_slow(self, pdf_path: str, size: int, elapsed: float, profile: dict):
+        pages = profile.get("page_seconds") or []
+        slowest = sorted(enumerate(pages, 1), key=lambda p: p[1], reverse=True)[:3]
+        detail = ", ".join(f"p{n} {s:.1f}s" for n, s in slowest) or "no page timings"
+        print(f"   🐢 Slow file: {os.path.basename(pdf_path)} {elapsed:.1f}s | "
+              f"{size / 1024:.0f} KB | {len(pages)} pages | {detail}")
+
+    def _quarantine(self, pdf_path: str, reason: str):
+        try:
+            st = os.stat(pdf_path)
+            size, mtime_ns = st.st_size, st.st_mtime_ns
+        except OSError:
+            size, mtime_ns = 0, None
+        entry = {
+            "path": pdf_path,
+            "reason": reason,
+            "size_bytes": size,
+            "mtime_ns": mtime_ns,
+            "quarantined_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        self.quarantined.append(entry)
+        print(f"   🚫 Quarantined {os.path.basename(pdf_path)}: {reason}")
+
+        # One entry per path; size and mtime decide whether later runs skip it
+        self._known[pdf_path] = entry
+        self._save_quarantine()
+
+    def close(self):
+        if self.conn is not None and self.process is not None and self.process.is_alive():
+            try:
+                self.conn.send(None)
+                self.process.join(timeout=5)
+            except (BrokenPipeError, OSError):
+                pass
+        self._kill()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract PDFs under a per-document time and memory budget")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--retry-quarantined", action="store_true", help="Try quarantined files again")
+    args = parser.parse_args()
+
+    with SandboxedExtractor(retry_quarantined=args.retry_quarantined) as extractor:
+        for pdf_path in args.files:
+            text = extractor.extract_text(pdf_path)
+            print(f"📄 {os.path.basename(pdf_path)}: {len(text)} chars")
+
+    if extractor.quarantined:
+        print(f"\n🚫 {len(extractor.quarantined)} quarantined → {QUARANTINE_FILE}")
+
+
+if __name__ == "__main__":
+    main()
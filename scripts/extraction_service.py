@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Warm invoice extraction service
+Keeps the extraction code from extract_invoices.py loaded in a long-lived
+process so the web app can use it without paying Python startup per upload.
+
+Endpoints (localhost HTTP):
+    POST /extract?filename=NAME   body = raw PDF/image bytes, Content-Type set
+    GET  /health                  liveness + current load
+    GET  /metrics                 request counters, cache hits, latency
+
+Each concurrency slot owns a sandboxed worker process (extraction_sandbox.py):
+a PDF that runs past --time-budget gets its worker killed and the slot is
+freed for the next request (504), instead of being held forever. A PDF the
+parser rejects or that crashes its worker is a 422; a worker that can't be
+(re)started is a 503, and the slot tries again on its next request. The
+service never extracts in the request thread.
+
+Usage:
+    python extraction_service.py [--host 127.0.0.1] [--port 8765] [--concurrency 4] [--time-budget 30]
+
+Point the Next.js app at it with EXTRACTION_SERVICE_URL=http://127.0.0.1:8765
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import hashlib
+import argparse
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from extract_invoices import extract_text_with_vision, parse_invoice_text
+from extraction_sandbox import SandboxedExtractor
+
+# Configuration
+HOST = "127.0.0.1"
+PORT = int(os.environ.get("EXTRACTION_SERVICE_PORT", "8765"))
+MAX_CONCURRENCY = 4
+QUEUE_TIMEOUT_SECONDS = 10
+TIME_BUDGET_SECONDS = 30
+MAX_BODY_BYTES = 25 * 1024 * 1024
+CACHE_SIZE = 512
+
+# Report a missing PDF backend at startup (the sandboxed workers import it too)
+try:
+    import pdfplumber  # noqa: F401
+except ImportError:
+    print("⚠️  pdfplumber not installed - falling back to PyPDF2/pdf2image")
+
+
+class ResultCache:
+    """Small thread-safe LRU keyed by the SHA-256 of the document bytes"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key: str, value: dict):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+
+class Metrics:
+    """Counters exposed on /metrics"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.rejected = 0
+        self.cache_hits = 0
+        self.in_flight = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, error: bool = False, cache_hit: bool = False):
+        with self._lock:
+            self.requests += 1
+            self.errors += int(error)
+            self.cache_hits += int(cache_hit)
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+
+    def reject(self):
+        with self._lock:
+            self.rejected += 1
+
+    def adjust_in_flight(self, delta: int):
+        with self._lock:
+            self.in_flight += delta
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "uptime_seconds": round(time.time() - self.started_at, 1),
+                "requests": self.requests,
+                "errors": self.errors,
+                "rejected": self.rejected,
+                "cache_hits": self.cache_hits,
+                "in_flight": self.in_flight,
+                "avg_seconds": round(self.total_seconds / self.requests, 4) if self.requests else 0,
+                "max_seconds": round(self.max_seconds, 4),
+            }
+
+
+class ExtractionLimitExceeded(Exception):
+    """The document couldn't be extracted within the sandbox; carries the HTTP status"""
+
+    def __init__(self, status: int, reason: str):
+        super().__init__(reason)
+        self.status = status
+
+
+def extract_document(data: bytes, content_type: str, filename: str, extractor: SandboxedExtractor) -> dict:
+    """Run the same extraction as the CLI on in-memory bytes"""
+    if content_type == "application/pdf" or filename.lower().endswith(".pdf"):
+        try:
+            status, text = extractor.run(data, filename)
+        except RuntimeError as e:
+            # Worker failed to start; retried on this slot's next request
+            raise ExtractionLimitExceeded(503, str(e))
+        if status == "timeout":
+            raise ExtractionLimitExceeded(504, text)
+        if status != "ok":
+            # crash, memory limit or a malformed PDF: the document's fault, not ours
+            raise ExtractionLimitExceeded(422, text)
+    elif content_type.startswith("image/"):
+        text = extract_text_with_vision(data)
+    else:
+        raise ValueError(f"Unsupported content type: {content_type}")
+
+    result = parse_invoice_text(text, filename)
+    result["raw_text"] = text
+    return result
+
+
+class ExtractionHandler(BaseHTTPRequestHandler):
+    server_version = "InvoiceExtraction/1.0"
+
+    def _send_json(self, status: int, body: dict):
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        # Requests are summarised in /metrics; keep stdout for errors only
+        pass
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/health":
+            self._send_json(200, {"status": "ok", "in_flight": self.server.metrics.in_flight})
+        elif path == "/metrics":
+            self._send_json(200, self.server.metrics.snapshot())
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/extract":
+            self._send_json(404, {"error": "Not found"})
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0:
+            self._send_json(400, {"error": "Empty body"})
+            return
+        if length > MAX_BODY_BYTES:
+            self._send_json(413, {"error": "File too large"})
+            return
+
+        data = self.rfile.read(length)
+        content_type = (self.headers.get("Content-Type") or "").split(";")[0].strip()
+        filename = parse_qs(url.query).get("filename", ["upload"])[0]
+        metrics = self.server.metrics
+
+        key = hashlib.sha256(data).hexdigest()
+        cached = self.server.cache.get(key)
+        if cached is not None:
+            metrics.record(0.0, cache_hit=True)
+            self._send_json(200, dict(cached, filename=filename))
+            return
+
+        # Bound the number of extractions running at once; extra requests wait briefly
+        try:
+            extractor = self.server.extractors.get(timeout=QUEUE_TIMEOUT_SECONDS)
+        except queue.Empty:
+            metrics.reject()
+            self._send_json(503, {"error": "Extraction service busy"})
+            return
+
+        start = time.perf_counter()
+        metrics.adjust_in_flight(1)
+        try:
+            result = extract_document(data, content_type, filename, extractor)
+        except ExtractionLimitExceeded as e:
+            print(f"🚫 {filename}: {e}")
+            metrics.record(time.perf_counter() - start, error=True)
+            self._send_json(e.status, {"error": f"Extraction aborted: {e}"})
+            return
+        except ValueError as e:
+            metrics.record(time.perf_counter() - start, error=True)
+            self._send_json(415, {"error": str(e)})
+            return
+        except Exception as e:
+            print(f"❌ Extraction failed for {filename}: {e}")
+            metrics.record(time.perf_counter() - start, error=True)
+            self._send_json(500, {"error": "Extraction failed"})
+            return
+        finally:
+            metrics.adjust_in_flight(-1)
+            # A timed-out worker was killed; the slot restarts it on next use
+            self.server.extractors.put(extractor)
+
+        metrics.record(time.perf_counter() - start)
+        self.server.cache.put(key, result)
+        self._send_json(200, result)
+
+
+def create_server(host: str, port: int, concurrency: int,
+                  time_budget: float = TIME_BUDGET_SECONDS) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), ExtractionHandler)
+    server.daemon_threads = True
+    # One sandboxed worker per slot; uploads have no path, so nothing is written to the quarantine file
+    server.extractors = queue.Queue()
+    for _ in range(concurrency):
+        extractor = SandboxedExtractor(time_budget=time_budget, quarantine_file=None,
+                                       fallback_in_process=False)
+        try:
+            extractor.warm()
+        except RuntimeError as e:
+            print(f"⚠️  {e}; the slot will retry on its first request")
+        server.extractors.put(extractor)
+    server.cache = ResultCache(CACHE_SIZE)
+    server.metrics = Metrics()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm invoice extraction service")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY)
+    parser.add_argument("--time-budget", type=float, default=TIME_BUDGET_SECONDS, help="Seconds per PDF")
+    args = parser.parse_args()
+
+    server = create_server(args.host, args.port, args.concurrency, args.time_budget)
+    print(f"🔍 Extraction service listening on http://{args.host}:{args.port}")
+    print(f"   Concurrency: {args.concurrency} | time budget {args.time_budget:g}s per PDF")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        while not server.extractors.empty():
+            server.extractors.get().close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Duplicate and near-duplicate invoice detection
+Checked before any API call so a re-uploaded, re-scanned or re-exported
+invoice doesn't cost extraction, an upload and a fake payment.
+
+Three indexes, all keyed lookups in SQLite (no scan over past invoices):
+1. Exact content hash (SHA-256 of the file bytes)
+2. Exact business key: (invoice_number, amount in cents)
+3. MinHash/LSH over word shingles of the extracted text, for copies whose
+   bytes differ (re-scans, re-exports, different folders). Only counted when
+   the invoice numbers match or one side has none, since one supplier
+   template yields near-identical text for different invoices
+
+Usage:
+    python invoice_dedup.py FOLDER [FOLDER ...]     # report duplicates only
+"""
+
+import os
+import re
+import sys
+import struct
+import random
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+
+# Configuration
+DEDUP_INDEX = os.environ.get("INVOICE_DEDUP_INDEX", "/tmp/invoice_dedup.sqlite")
+NUM_PERM = 128
+BANDS = 16                 # 16 bands x 8 rows: candidates from ~0.7 Jaccard
+SHINGLE_WORDS = 3
+NEAR_DUP_THRESHOLD = 0.9   # estimated Jaccard needed to call it a duplicate
+
+_MERSENNE = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_ROWS = NUM_PERM // BANDS
+
+# Fixed permutations so signatures stay comparable across runs
+_rng = random.Random(0x1DEDC0DE)
+_PERMS = [(_rng.randrange(1, _MERSENNE), _rng.randrange(0, _MERSENNE)) for _ in range(NUM_PERM)]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id             INTEGER PRIMARY KEY AUTOINCREMENT,
+    path           TEXT NOT NULL,
+    content_hash   TEXT,
+    invoice_number TEXT,
+    amount_cents   INTEGER,
+    signature      BLOB,
+    ref            TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_documents_hash ON documents(content_hash);
+CREATE INDEX IF NOT EXISTS idx_documents_key ON documents(invoice_number, amount_cents);
+CREATE TABLE IF NOT EXISTS lsh_buckets (
+    band        INTEGER NOT NULL,
+    bucket      TEXT NOT NULL,
+    document_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_lsh_buckets ON lsh_buckets(band, bucket);
+"""
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def amount_cents(amount) -> int:
+    return int(round(float(amount) * 100)) if amount else None
+
+
+def shingles(text: str) -> set:
+    """Hashed word shingles of whitespace/case-normalized text"""
+    words = re.findall(r'[A-Z0-9]+', text.upper())
+    if len(words) < SHINGLE_WORDS:
+        words = words + [""] * (SHINGLE_WORDS - len(words))
+    return {
+        int.from_bytes(hashlib.blake2b(" ".join(words[i:i + SHINGLE_WORDS]).encode(), digest_size=4).digest(), "big")
+        for i in range(len(words) - SHINGLE_WORDS + 1)
+    }
+
+
+def minhash(text: str) -> list:
+    """MinHash signature (NUM_PERM values) of the text's shingles"""
+    shingle_set = shingles(text)
+    if not shingle_set:
+        return None
+    return [
+        min(((a * s + b) % _MERSENNE) & _MAX_HASH for s in shingle_set)
+        for a, b in _PERMS
+    ]
+
+
+def band_keys(signature: list) -> list:
+    return [
+        (band, hashlib.blake2b(struct.pack(f">{_ROWS}I", *signature[band * _ROWS:(band + 1) * _ROWS]),
+                               digest_size=8).hexdigest())
+        for band in range(BANDS)
+    ]
+
+
+def pack_signature(signature: list) -> bytes:
+    return struct.pack(f">{NUM_PERM}I", *signature)
+
+
+def unpack_signature(blob: bytes) -> tuple:
+    return struct.unpack(f">{NUM_PERM}I", blob)
+
+
+def similarity(sig_a, sig_b) -> float:
+    """Estimated Jaccard similarity from two signatures"""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / NUM_PERM
+
+
+class DedupIndex:
+    """Persistent duplicate index; safe to share between threads"""
+
+    def __init__(self, path: str = DEDUP_INDEX):
+        # Several worker processes may share one index file (distributed_process.py)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def find_by_hash(self, content_hash: str):
+        """Earlier document with identical bytes, or None"""
+        with self._lock:
+            return self._find_by_hash(content_hash)
+
+    def find_similar(self, invoice_data: dict, text: str, signature: list = None):
+        """Earlier document with the same invoice key or near-identical text, or None"""
+        with self._lock:
+            return self._find_similar(invoice_data, text, signature)
+
+    def add(self, path: str, content_hash: str, invoice_data: dict, text: str,
+            ref: str = None, signature: list = None) -> int:
+        """Record an ingested document in all three indexes; returns its id"""
+        with self._lock:
+            doc_id = self._insert(path, content_hash, invoice_data, text, ref, signature)
+            self.conn.commit()
+        return doc_id
+
+    def add_if_new(self, path: str, content_hash: str, invoice_data: dict, text: str,
+                   ref: str = None, signature: list = None) -> tuple:
+        """Check and record in one write transaction: (duplicate hit, None) or (None, new id)
+
+        Call it just before creating the payment, so two workers holding copies
+        of one invoice can't both pass the check. If the payment then fails,
+        remove() the id so a retry isn't reported as a duplicate of itself.
+        """
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                hit = (self._find_by_hash(content_hash) if content_hash else None) or \
+                    self._find_similar(invoice_data, text, signature)
+                if hit:
+                    self.conn.rollback()
+                    return hit, None
+                doc_id = self._insert(path, content_hash, invoice_data, text, ref, signature)
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+        return None, doc_id
+
+    def remove(self, doc_id: int):
+        """Forget a document recorded for an ingestion that didn't happen"""
+        with self._lock:
+            self.conn.execute("DELETE FROM lsh_buckets WHERE document_id = ?", (doc_id,))
+            self.conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+            self.conn.commit()
+
+    def _find_by_hash(self, content_hash: str):
+        row = self.conn.execute(
+            "SELECT path, ref FROM documents WHERE content_hash = ? LIMIT 1", (content_hash,)
+        ).fetchone()
+        return {"reason": "same file content", "path": row[0], "ref": row[1]} if row else None
+
+    def _find_similar(self, invoice_data: dict, text: str, signature: list = None):
+        number = invoice_data.get("invoice_number")
+        cents = amount_cents(invoice_data.get("total_amount"))
+
+        if number and cents:
+            row = self.conn.execute(
+                "SELECT path, ref FROM documents WHERE invoice_number = ? AND amount_cents = ? LIMIT 1",
+                (number, cents),
+            ).fetchone()
+            if row:
+                return {"reason": f"same invoice number and amount ({number})", "path": row[0], "ref": row[1]}
+
+        signature = signature or (minhash(text) if text else None)
+        if not signature:
+            return None
+
+        # One indexed query: bucket hits joined to their documents, with other
+        # invoice numbers/amounts (same template, different invoice) filtered
+        # out before any signature is loaded
+        keys = band_keys(signature)
+        rows = self.conn.execute(
+            "SELECT DISTINCT d.id, d.path, d.ref, d.signature FROM lsh_buckets b "
+            "JOIN documents d ON d.id = b.document_id "
+            "WHERE (" + " OR ".join(["(b.band = ? AND b.bucket = ?)"] * len(keys)) + ") "
+            "AND (? IS NULL OR d.invoice_number IS NULL OR d.invoice_number = ?) "
+            "AND (? IS NULL OR d.amount_cents IS NULL OR d.amount_cents = ?) "
+            "ORDER BY d.id",
+            (*(v for key in keys for v in key), number or None, number or None, cents, cents),
+        ).fetchall()
+
+        for _doc_id, path, ref, blob in rows:
+            score = similarity(signature, unpack_signature(blob))
+            if score >= NEAR_DUP_THRESHOLD:
+                return {"reason": f"near-identical text ({score:.0%})", "path": path, "ref": ref}
+        return None
+
+    def _insert(self, path: str, content_hash: str, invoice_data: dict, text: str,
+                ref: str = None, signature: list = None) -> int:
+        signature = signature or (minhash(text) if text else None)
+        cur = self.conn.execute(
+            "INSERT INTO documents (path, content_hash, invoice_number, amount_cents, signature, ref) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (path, content_hash, invoice_data.get("invoice_number"),
+             amount_cents(invoice_data.get("total_amount")),
+             pack_signature(signature) if signature else None, ref),
+        )
+        if signature:
+            self.conn.executemany(
+                "INSERT INTO lsh_buckets (band, bucket, document_id) VALUES (?, ?, ?)",
+                [(band, bucket, cur.lastrowid) for band, bucket in band_keys(signature)],
+            )
+        return cur.lastrowid
+
+    def close(self):
+        self.conn.close()
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from extract_invoices import extract_text_from_pdf, parse_invoice_text
+
+    # Report-only run: use a throwaway in-memory index
+    index = DedupIndex(":memory:")
+    duplicates = 0
+    for folder in sys.argv[1:]:
+        for pdf_path in sorted(Path(folder).glob("*.pdf")):
+            content_hash = file_sha256(str(pdf_path))
+            hit = index.find_by_hash(content_hash)
+            text = ""
+            if not hit:
+                text = extract_text_from_pdf(str(pdf_path))
+                invoice_data = parse_invoice_text(text, pdf_path.name)
+                signature = minhash(text) if text else None
+                hit = index.find_similar(invoice_data, text, signature)
+            if hit:
+                duplicates += 1
+                print(f"🔁 {pdf_path} duplicates {hit['path']} ({hit['reason']})")
+                continue
+            index.add(str(pdf_path), content_hash, invoice_data, text, signature=signature)
+
+    print(f"\n📊 Duplicates found: {duplicates}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test for the ingestion path
+Drives process_all_invoices.py at a chosen concurrency against a local
+stand-in API (or any BASE_URL) and reports throughput, latency percentiles
+and failures.
+
+Usage:
+    python load_test.py FOLDER [--files 200] [--concurrency 8]
+                        [--stub] [--latency-ms 80] [--error-rate 0.01] [--rate-limit 0]
+                        [--base-url http://127.0.0.1:8787/api] [--api-only] [--timeout 30]
+
+--stub starts api_stub_server.py in-process on a free port.
+--api-only extracts each distinct PDF once up front and measures only the
+API steps (payment, upload, link).
+--timeout bounds every API request; connection errors and timeouts count as
+failed files, grouped by exception type in the report.
+"""
+
+import io
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import threading
+import contextlib
+from pathlib import Path
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import requests
+import process_all_invoices as pipeline
+from requests.adapters import HTTPAdapter
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class RequestRecorder:
+    """requests response hook that records latency per endpoint"""
+
+    def __init__(self):
+        self.samples = []
+        self._lock = threading.Lock()
+
+    def __call__(self, response, *args, **kwargs):
+        path = urlparse(response.url).path
+        if path.startswith("/api/payments/"):
+            path = "/api/payments/{id}"
+        key = f"{response.request.method} {path}"
+        with self._lock:
+            self.samples.append((key, response.elapsed.total_seconds(), response.status_code))
+        return response
+
+
+def start_stub(args):
+    from api_stub_server import create_server
+    server = create_server(port=0, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                           error_rate=args.error_rate, rate_limit=args.rate_limit)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return server, f"http://{host}:{port}/api"
+
+
+def run_load(pdf_files: list, concurrency: int, api_only: bool) -> tuple:
+    """Process the file list with a thread pool; returns (results, seconds)"""
+    extracted = {}
+    if api_only:
+        for path in set(pdf_files):
+            extracted[path] = pipeline.extract_invoice_data(str(path))
+
+    def work(path: Path) -> dict:
+        try:
+            if api_only:
+                data = extracted[path]
+                if not data["total_amount"]:
+                    return {"file": path.name, "status": "skipped", "reason": "no amount"}
+                return pipeline.ingest_invoice(path, data)
+            return pipeline.process_file(path)
+        except requests.RequestException as e:
+            # One unreachable or stalled request fails this file, not the run
+            return {"file": path.name, "status": "failed", "reason": type(e).__name__}
+
+    # The pipeline prints per-step progress; keep the report readable
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(work, pdf_files))
+    return results, time.perf_counter() - start
+
+
+def print_report(results: list, samples: list, seconds: float):
+    print("\n" + "=" * 72)
+    print("📊 LOAD TEST REPORT")
+    print("=" * 72)
+
+    by_status = {}
+    for r in results:
+        by_status[r["status"]] = by_status.get(r["status"], 0) + 1
+    print(f"  Files:       {len(results)} in {seconds:.2f}s → {len(results) / seconds:.1f} files/s")
+    print(f"  Requests:    {len(samples)} → {len(samples) / seconds:.1f} req/s")
+    print(f"  Outcomes:    {json.dumps(by_status)}")
+    errors = {}
+    for r in results:
+        if r["status"] == "failed":
+            errors[r.get("reason", "unknown")] = errors.get(r.get("reason", "unknown"), 0) + 1
+    if errors:
+        print(f"  Failures:    {json.dumps(errors)}")
+
+    endpoints = {}
+    for key, elapsed, status in samples:
+        endpoints.setdefault(key, []).append((elapsed, status))
+
+    print()
+    print(f"  {'Endpoint':<28} {'n':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'fail':>6}")
+    print("  " + "-" * 68)
+    all_latencies = []
+    for key in sorted(endpoints):
+        latencies = sorted(e * 1000 for e, _ in endpoints[key])
+        failures = sum(1 for _, s in endpoints[key] if s >= 400)
+        all_latencies.extend(latencies)
+        print(f"  {key:<28} {len(latencies):>6} {percentile(latencies, 50):>8.1f} "
+              f"{percentile(latencies, 95):>8.1f} {percentile(latencies, 99):>8.1f} {failures:>6}")
+    all_latencies.sort()
+    failures = sum(1 for _, _, s in samples if s >= 400)
+    print("  " + "-" * 68)
+    print(f"  {'ALL':<28} {len(all_latencies):>6} {percentile(all_latencies, 50):>8.1f} "
+          f"{percentile(all_latencies, 95):>8.1f} {percentile(all_latencies, 99):>8.1f} {failures:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the ingestion path")
+    parser.add_argument("folder", help="Folder of sample PDFs (cycled to reach --files)")
+    parser.add_argument("--files", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--base-url", default=None)
+    parser.add_argument("--stub", action="store_true", help="Start a local stub API")
+    parser.add_argument("--latency-ms", type=float, default=80)
+    parser.add_argument("--jitter-ms", type=float, default=40)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0)
+    parser.add_argument("--api-only", action="store_true")
+    parser.add_argument("--timeout", type=float, default=30, help="Seconds per API request")
+    args = parser.parse_args()
+
+    samples_pdfs = sorted(Path(args.folder).glob("*.pdf"))
+    if not samples_pdfs:
+        print(f"❌ No PDFs in {args.folder}")
+        return
+    pdf_files = [samples_pdfs[i % len(samples_pdfs)] for i in range(args.files)]
+
+    server = None
+    if args.stub:
+        server, pipeline.BASE_URL = start_stub(args)
+    elif args.base_url:
+        pipeline.BASE_URL = args.base_url
+
+    if "run.app" in pipeline.BASE_URL:
+        print("❌ Refusing to load test production; use --stub or --base-url")
+        return
+
+    pipeline.REQUEST_TIMEOUT_SECONDS = args.timeout
+    recorder = RequestRecorder()
+    pipeline.SESSION.hooks["response"].append(recorder)
+    adapter = HTTPAdapter(pool_connections=args.concurrency, pool_maxsize=args.concurrency)
+    pipeline.SESSION.mount("http://", adapter)
+    pipeline.SESSION.mount("https://", adapter)
+
+    print(f"🚀 {args.files} files × concurrency {args.concurrency} → {pipeline.BASE_URL}")
+    results, seconds = run_load(pdf_files, args.concurrency, args.api_only)
+    print_report(results, recorder.samples, seconds)
+
+    if server:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,9 +4,16 @@ Match OMNI 2025 invoices with payments awaiting invoices
 Logic:
 1. Match by exact amount
 2. If multiple invoices have same amount, pick closest date to payment date
+
+Live data instead of the lists below (see sync_replica.py):
+    python match_omni_payments.py --replica /tmp/invoice_flow_replica.sqlite --company COMPANY_ID
+
+Matching is by amount only, so it runs one supplier at a time; use
+reconcile_partitioned.py --replica to reconcile every company.
 """
 
 import json
+import argparse
 from datetime import datetime
 from collections import defaultdict
 
@@ -147,12 +154,16 @@ def days_between(date1, date2):
     return abs((d1 - d2).days)
 
 
-def match_payments_to_invoices():
+def match_payments_to_invoices(payments=None, invoices=None):
     """Match payments to invoices by amount, then by closest date"""
+    if payments is None:
+        payments = PAYMENTS
+    if invoices is None:
+        invoices = INVOICES
     
     # Build index of invoices by amount
     invoice_by_amount = defaultdict(list)
-    for inv in INVOICES:
+    for inv in invoices:
         invoice_by_amount[inv["total_amount"]].append(inv)
     
     # Track used invoices
@@ -161,7 +172,7 @@ def match_payments_to_invoices():
     matches = []
     unmatched_payments = []
     
-    for i, payment in enumerate(PAYMENTS):
+    for i, payment in enumerate(payments):
         payment_amount = payment["amount"]
         payment_date = payment["date"]
         
@@ -200,15 +211,34 @@ def match_payments_to_invoices():
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Match payments awaiting invoices to invoices")
+    parser.add_argument("--replica", help="SQLite replica from sync_replica.py instead of the built-in lists")
+    parser.add_argument("--company", help="Supplier company id to match (required with --replica)")
+    args = parser.parse_args()
+    if args.replica and not args.company:
+        # Amount-only matching across suppliers would pair one company's payment with another's invoice
+        parser.error("--replica needs --company; use reconcile_partitioned.py --replica for all companies")
+    
+    if args.replica:
+        from sync_replica import load_replica
+        payments, invoices = load_replica(args.replica, args.company)
+    else:
+        payments, invoices = PAYMENTS, INVOICES
+    
     print("=" * 100)
-    print("📋 PAYMENT - INVOICE MATCHING (OMNI 2025)")
+    print("📋 PAYMENT - INVOICE MATCHING " + (f"({args.company})" if args.replica else "(OMNI 2025)"))
     print("=" * 100)
     print()
-    print(f"📊 Payments: {len(PAYMENTS)}")
-    print(f"📊 Invoices: {len(INVOICES)}")
+    print(f"📊 Payments: {len(payments)}")
+    print(f"📊 Invoices: {len(invoices)}")
     print()
     
-    matches, unmatched = match_payments_to_invoices()
+    matches, unmatched = match_payments_to_invoices(payments, invoices)
+    
+    # Totals are computed once and reused by every section below
+    total_matched = sum(m['payment_amount'] for m in matches)
+    total_unmatched = sum(p['amount'] for p in unmatched)
+    total_payments = total_matched + total_unmatched
     
     # Print matches
     print("=" * 100)
@@ -218,10 +248,8 @@ def main():
     print(f"{'Payment Date':<14} {'Amount':>14} {'Invoice #':<14} {'Invoice Date':<14} {'Days Diff':>10}")
     print("-" * 100)
     
-    total_matched = 0
     for m in matches:
         print(f"{m['payment_date']:<14} RM {m['payment_amount']:>11,.2f} {m['invoice_number']:<14} {m['invoice_date']:<14} {m['date_diff_days']:>10}")
-        total_matched += m['payment_amount']
     
     print("-" * 100)
     print(f"{'TOTAL':<14} RM {total_matched:>11,.2f}")
@@ -238,10 +266,8 @@ def main():
         print(f"{'Payment Date':<14} {'Amount':>14}")
         print("-" * 40)
         
-        total_unmatched = 0
         for p in unmatched:
             print(f"{p['date']:<14} RM {p['amount']:>11,.2f}")
-            total_unmatched += p['amount']
         
         print("-" * 40)
         print(f"{'TOTAL':<14} RM {total_unmatched:>11,.2f}")
@@ -254,19 +280,19 @@ def main():
     print("📊 SUMMARY")
     print("=" * 100)
     print(f"  ✅ Matched:   {len(matches):>3} payments = RM {total_matched:>14,.2f}")
-    print(f"  ❌ Unmatched: {len(unmatched):>3} payments = RM {sum(p['amount'] for p in unmatched):>14,.2f}")
-    print(f"  📋 Total:     {len(PAYMENTS):>3} payments = RM {sum(p['amount'] for p in PAYMENTS):>14,.2f}")
+    print(f"  ❌ Unmatched: {len(unmatched):>3} payments = RM {total_unmatched:>14,.2f}")
+    print(f"  📋 Total:     {len(payments):>3} payments = RM {total_payments:>14,.2f}")
     
     # Save mapping to file
     output = {
         "matches": matches,
         "unmatched_payments": unmatched,
         "summary": {
-            "total_payments": len(PAYMENTS),
+            "total_payments": len(payments),
             "matched": len(matches),
             "unmatched": len(unmatched),
             "matched_amount": total_matched,
-            "unmatched_amount": sum(p['amount'] for p in unmatched),
+            "unmatched_amount": total_unmatched,
         }
     }
     
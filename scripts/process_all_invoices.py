@@ -10,6 +10,7 @@ Process all invoices from multiple folders:
 import os
 import re
 import json
+import argparse
 import requests
 from pathlib import Path
 from datetime import datetime, timedelta
@@ -22,8 +23,21 @@ FOLDERS = [
     "/Users/waikiengoh/Downloads/VGIFT 2025",
 ]
 
-API_KEY = "inv_7ea0609b5f284f0d898519cfafe74996aac5819695d61b76a0eb6e595097efa7"
-BASE_URL = "https://invoice-flow-410757682662.asia-southeast1.run.app/api"
+API_KEY = os.environ.get("INVOICE_FLOW_API_KEY", "inv_7ea0609b5f284f0d898519cfafe74996aac5819695d61b76a0eb6e595097efa7")
+# Point at a local stand-in (scripts/api_stub_server.py) for experiments
+BASE_URL = os.environ.get("INVOICE_FLOW_BASE_URL", "https://invoice-flow-410757682662.asia-southeast1.run.app/api")
+
+# Shared session: keeps connections alive across the three calls per invoice
+SESSION = requests.Session()
+# Seconds to connect / wait for a response, so a stalled API can't hang the run
+REQUEST_TIMEOUT_SECONDS = float(os.environ.get("INVOICE_FLOW_TIMEOUT", "60"))
+
+# Optional JSON export of the Company table for recipient resolution
+COMPANIES_FILE = os.environ.get("INVOICE_COMPANIES_FILE", "")
+
+from invoice_dedup import DedupIndex, DEDUP_INDEX, minhash
+from document_handle import DocumentHandle
+from scan_manifest import ScanManifest, SCAN_MANIFEST
 
 # Import pdfplumber
 try:
@@ -33,15 +47,8 @@ except ImportError:
     exit(1)
 
 
-def extract_invoice_data(pdf_path: str) -> dict:
-    """Extract invoice data from PDF using pdfplumber"""
-    result = {
-        "invoice_number": None,
-        "invoice_date": None,
-        "recipient_name": None,
-        "total_amount": None,
-    }
-    
+def read_pdf_text(pdf_path) -> str:
+    """Extract the text layer of a PDF (path or binary stream) using pdfplumber ("" on failure)"""
     try:
         with pdfplumber.open(pdf_path) as pdf:
             text = ""
@@ -49,9 +56,23 @@ def extract_invoice_data(pdf_path: str) -> dict:
                 page_text = page.extract_text()
                 if page_text:
                     text += page_text + "\n"
+            return text
     except Exception as e:
         print(f"      ⚠️ PDF read error: {e}")
-        return result
+        return ""
+
+
+def extract_invoice_data(pdf_path: str, text: str = None) -> dict:
+    """Extract invoice data from PDF using pdfplumber (or already-read text)"""
+    result = {
+        "invoice_number": None,
+        "invoice_date": None,
+        "recipient_name": None,
+        "total_amount": None,
+    }
+    
+    if text is None:
+        text = read_pdf_text(pdf_path)
     
     if not text:
         return result
@@ -153,7 +174,7 @@ def create_payment(amount: float, invoice_date: str, description: str) -> dict:
     else:
         payment_date = datetime.now().strftime("%Y-%m-%d")
     
-    response = requests.post(
+    response = SESSION.post(
         f"{BASE_URL}/payments",
         headers={
             "X-API-Key": API_KEY,
@@ -163,7 +184,8 @@ def create_payment(amount: float, invoice_date: str, description: str) -> dict:
             "amount": amount,
             "date": payment_date,
             "description": description
-        }
+        },
+        timeout=REQUEST_TIMEOUT_SECONDS
     )
     
     if response.ok:
@@ -172,27 +194,37 @@ def create_payment(amount: float, invoice_date: str, description: str) -> dict:
         return None
 
 
-def upload_invoice(pdf_path: str, invoice_data: dict) -> dict:
-    """Upload invoice PDF via API"""
-    with open(pdf_path, 'rb') as f:
-        files = {'file': (os.path.basename(pdf_path), f, 'application/pdf')}
-        data = {}
-        
-        if invoice_data["invoice_number"]:
-            data["invoiceNumber"] = invoice_data["invoice_number"]
-        if invoice_data["invoice_date"]:
-            data["invoiceDate"] = invoice_data["invoice_date"]
-        if invoice_data["recipient_name"]:
-            data["recipientName"] = invoice_data["recipient_name"]
-        if invoice_data["total_amount"]:
-            data["totalAmount"] = str(invoice_data["total_amount"])
-        
-        response = requests.post(
+def upload_invoice(pdf_path: str, invoice_data: dict, document: DocumentHandle = None) -> dict:
+    """Upload invoice PDF via API (streamed from `document` when already read)"""
+    data = {}
+    
+    if invoice_data["invoice_number"]:
+        data["invoiceNumber"] = invoice_data["invoice_number"]
+    if invoice_data["invoice_date"]:
+        data["invoiceDate"] = invoice_data["invoice_date"]
+    if invoice_data["recipient_name"]:
+        data["recipientName"] = invoice_data["recipient_name"]
+    if invoice_data["total_amount"]:
+        data["totalAmount"] = str(invoice_data["total_amount"])
+    
+    if document is not None:
+        body, content_type = document.multipart("file", document.name, "application/pdf", data)
+        response = SESSION.post(
             f"{BASE_URL}/invoices",
-            headers={"X-API-Key": API_KEY},
-            files=files,
-            data=data
+            headers={"X-API-Key": API_KEY, "Content-Type": content_type},
+            data=body,
+            timeout=REQUEST_TIMEOUT_SECONDS
         )
+    else:
+        with open(pdf_path, 'rb') as f:
+            files = {'file': (os.path.basename(pdf_path), f, 'application/pdf')}
+            response = SESSION.post(
+                f"{BASE_URL}/invoices",
+                headers={"X-API-Key": API_KEY},
+                files=files,
+                data=data,
+                timeout=REQUEST_TIMEOUT_SECONDS
+            )
     
     if response.ok:
         return response.json()
@@ -202,100 +234,236 @@ def upload_invoice(pdf_path: str, invoice_data: dict) -> dict:
 
 def link_payment_to_invoice(payment_id: str, invoice_id: str) -> bool:
     """Link a payment to an invoice"""
-    response = requests.put(
+    response = SESSION.put(
         f"{BASE_URL}/payments/{payment_id}",
         headers={
             "X-API-Key": API_KEY,
             "Content-Type": "application/json"
         },
-        json={"invoiceId": invoice_id}
+        json={"invoiceId": invoice_id},
+        timeout=REQUEST_TIMEOUT_SECONDS
     )
     return response.ok
 
 
-def process_folder(folder_path: str) -> list:
-    """Process all PDFs in a folder"""
-    results = []
-    folder = Path(folder_path)
-    folder_name = folder.name
+def load_company_index():
+    """Build the recipient -> company index when a company export is configured"""
+    if not COMPANIES_FILE:
+        return None
+    from company_resolver import CompanyIndex
+    index = CompanyIndex.from_json(COMPANIES_FILE)
+    print(f"🏢 Loaded {len(index.companies)} companies for recipient matching")
+    return index
+
+
+def process_file(pdf_path: Path, company_index=None, dedup_index=None, payment_id: str = None) -> dict:
+    """Extract, create payment, upload and link one PDF; returns its result row
+
+    With payment_id (an earlier run created the payment, then failed) the
+    file resumes at the upload instead of creating a second payment.
+    """
+    # The file is read from disk once; hashing, parsing and upload share the buffer
+    try:
+        document = DocumentHandle.open(pdf_path)
+    except OSError as e:
+        # Unreadable, or gone since the folder was scanned; report it and carry on
+        print(f"      ❌ Could not read file: {e}")
+        return {"file": pdf_path.name, "status": "failed", "reason": f"read error: {e}",
+                "io": {"bytes_read": 0, "read_ms": 0.0}}
+    with document:
+        result = _process_document(pdf_path, document, company_index, dedup_index, payment_id)
+    result["io"] = {"bytes_read": document.stats["bytes_read"],
+                    "read_ms": round(document.stats["read_seconds"] * 1000, 1)}
+    return result
+
+
+def _process_document(pdf_path: Path, document: DocumentHandle, company_index, dedup_index,
+                      payment_id: str = None) -> dict:
+    # A resumed file is already in the index as an original; don't check it against itself
+    if payment_id:
+        dedup_index = None
     
-    pdf_files = sorted(folder.glob('*.pdf'))
-    print(f"\n📂 {folder_name}: {len(pdf_files)} PDFs")
-    print("-" * 60)
+    # Step 0: Exact duplicate check before spending anything on the file
+    content_hash = None
+    if dedup_index:
+        content_hash = document.sha256
+        duplicate = dedup_index.find_by_hash(content_hash)
+        if duplicate:
+            print(f"      🔁 Duplicate of {duplicate['path']} ({duplicate['reason']})")
+            return {"file": pdf_path.name, "status": "duplicate", "reason": duplicate["reason"],
+                    "duplicate_of": duplicate["path"]}
     
-    for i, pdf_path in enumerate(pdf_files, 1):
-        print(f"[{i}/{len(pdf_files)}] {pdf_path.name}")
-        
-        # Step 1: Extract data
-        invoice_data = extract_invoice_data(str(pdf_path))
-        
-        if not invoice_data["total_amount"]:
-            print(f"      ⚠️ Skipped - no amount extracted")
-            results.append({"file": pdf_path.name, "status": "skipped", "reason": "no amount"})
-            continue
-        
-        print(f"      📋 {invoice_data['invoice_number']} | {invoice_data['invoice_date']} | RM {invoice_data['total_amount']:,.2f}")
-        
-        # Step 2: Create payment
+    # Step 1: Extract data
+    text = read_pdf_text(document.stream())
+    invoice_data = extract_invoice_data(str(pdf_path), text)
+    
+    if not invoice_data["total_amount"]:
+        print(f"      ⚠️ Skipped - no amount extracted")
+        return {"file": pdf_path.name, "status": "skipped", "reason": "no amount"}
+    
+    # Same invoice number/amount or near-identical text (re-scan, re-export).
+    # Recorded as an original in the same step, before the payment is created,
+    # so later copies are caught even if the upload after it fails.
+    doc_id = None
+    if dedup_index:
+        duplicate, doc_id = dedup_index.add_if_new(str(pdf_path), content_hash, invoice_data, text,
+                                                   signature=minhash(text) if text else None)
+        if duplicate:
+            print(f"      🔁 Duplicate of {duplicate['path']} ({duplicate['reason']})")
+            return {"file": pdf_path.name, "status": "duplicate", "reason": duplicate["reason"],
+                    "duplicate_of": duplicate["path"]}
+    
+    print(f"      📋 {invoice_data['invoice_number']} | {invoice_data['invoice_date']} | RM {invoice_data['total_amount']:,.2f}")
+    
+    recipient_company_id = None
+    if company_index and invoice_data["recipient_name"]:
+        recipient_company_id = company_index.resolve(invoice_data["recipient_name"])
+        if not recipient_company_id:
+            print(f"      ⚠️ No confident company match for recipient: {invoice_data['recipient_name']}")
+    
+    try:
+        result = ingest_invoice(pdf_path, invoice_data, recipient_company_id, document, payment_id)
+    except requests.RequestException:
+        # create_payment got no answer; drop the entry so the retry isn't a "duplicate"
+        if doc_id:
+            dedup_index.remove(doc_id)
+        raise
+    
+    # No payment was created: the file isn't an original yet
+    if doc_id and not result.get("payment_id"):
+        dedup_index.remove(doc_id)
+    
+    return result
+
+
+def ingest_invoice(pdf_path: Path, invoice_data: dict, recipient_company_id: str = None,
+                   document: DocumentHandle = None, payment_id: str = None) -> dict:
+    """Run the API steps (payment, upload, link) for already-extracted data"""
+    # Step 2: Create payment (unless resuming with one from an earlier run)
+    if payment_id:
+        print(f"      ↪️ Resuming with existing payment {payment_id}")
+        payment = {"id": payment_id}
+    else:
         payment = create_payment(
             invoice_data["total_amount"],
             invoice_data["invoice_date"],
             f"Payment for {invoice_data['invoice_number'] or pdf_path.name}"
         )
-        
-        if not payment:
-            print(f"      ❌ Failed to create payment")
-            results.append({"file": pdf_path.name, "status": "failed", "reason": "payment creation failed"})
-            continue
-        
+    
+    if not payment:
+        print(f"      ❌ Failed to create payment")
+        return {"file": pdf_path.name, "status": "failed", "reason": "payment creation failed"}
+    
+    # From here on the payment exists; failures report its id so it isn't lost
+    try:
         # Step 3: Upload invoice
-        invoice = upload_invoice(str(pdf_path), invoice_data)
+        invoice = upload_invoice(str(pdf_path), invoice_data, document)
         
         if not invoice:
             print(f"      ❌ Failed to upload invoice")
-            results.append({"file": pdf_path.name, "status": "failed", "reason": "invoice upload failed"})
-            continue
+            return {"file": pdf_path.name, "status": "failed", "reason": "invoice upload failed",
+                    "payment_id": payment["id"]}
         
         # Step 4: Link payment to invoice
         linked = link_payment_to_invoice(payment["id"], invoice["id"])
-        
-        if linked:
-            print(f"      ✅ Matched!")
-            results.append({
-                "file": pdf_path.name,
-                "status": "success",
-                "invoice_number": invoice_data["invoice_number"],
-                "invoice_date": invoice_data["invoice_date"],
-                "amount": invoice_data["total_amount"],
-                "recipient": invoice_data["recipient_name"],
-                "payment_id": payment["id"],
-                "invoice_id": invoice["id"]
-            })
-        else:
-            print(f"      ⚠️ Uploaded but failed to link")
-            results.append({"file": pdf_path.name, "status": "partial", "reason": "linking failed"})
+    except requests.RequestException as e:
+        print(f"      ❌ API request failed after payment: {type(e).__name__}")
+        return {"file": pdf_path.name, "status": "failed", "reason": type(e).__name__,
+                "payment_id": payment["id"]}
+    
+    if linked:
+        print(f"      ✅ Matched!")
+        return {
+            "file": pdf_path.name,
+            "status": "success",
+            "invoice_number": invoice_data["invoice_number"],
+            "invoice_date": invoice_data["invoice_date"],
+            "amount": invoice_data["total_amount"],
+            "recipient": invoice_data["recipient_name"],
+            "recipient_company_id": recipient_company_id,
+            "payment_id": payment["id"],
+            "invoice_id": invoice["id"]
+        }
+    else:
+        print(f"      ⚠️ Uploaded but failed to link")
+        return {"file": pdf_path.name, "status": "partial", "reason": "linking failed",
+                "payment_id": payment["id"], "invoice_id": invoice["id"]}
+
+
+def process_folder(folder_path: str, company_index=None, dedup_index=None, manifest=None) -> list:
+    """Process all PDFs in a folder (only new or modified ones when given a ScanManifest)
+
+    A file that failed before its payment was created stays pending and is
+    retried from scratch. One that failed after it is recorded with the
+    payment id and resumed from that payment on the next run.
+    """
+    results = []
+    folder = Path(folder_path)
+    folder_name = folder.name
+    resume = {}
+    
+    if manifest is not None:
+        scan = manifest.scan(folder_path)
+        resume = {
+            path: stored["payment_id"]
+            for path, stored in manifest.results(scan.unchanged).items()
+            if stored.get("status") == "failed" and stored.get("payment_id")
+        }
+        pdf_files = [Path(p) for p in sorted(scan.pending + list(resume))]
+        print(f"\n📂 {folder_name}: {scan.total} PDFs ({scan.describe()}, {len(resume)} to resume)")
+    else:
+        pdf_files = sorted(folder.glob('*.pdf'))
+        print(f"\n📂 {folder_name}: {len(pdf_files)} PDFs")
+    print("-" * 60)
+    
+    for i, pdf_path in enumerate(pdf_files, 1):
+        print(f"[{i}/{len(pdf_files)}] {pdf_path.name}")
+        try:
+            result = process_file(pdf_path, company_index, dedup_index, resume.get(str(pdf_path)))
+        except requests.RequestException as e:
+            # Timeouts / connection errors fail this file, not the whole run
+            print(f"      ❌ API request failed: {type(e).__name__}")
+            result = {"file": pdf_path.name, "status": "failed", "reason": type(e).__name__,
+                      "io": {"bytes_read": 0, "read_ms": 0.0}}
+        # Failed before any payment: not recorded, so the next run retries it
+        if manifest is not None and (result["status"] != "failed" or result.get("payment_id")):
+            manifest.record(pdf_path, {"status": result["status"], "invoice_id": result.get("invoice_id"),
+                                       "payment_id": result.get("payment_id")})
+        results.append(result)
     
     return results
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Extract, upload and link invoices from FOLDERS")
+    parser.add_argument("--full", action="store_true", help="Process every file, not just new or modified ones")
+    args = parser.parse_args()
+    
     print("=" * 60)
     print("🚀 PROCESSING ALL INVOICES")
     print("=" * 60)
     
     all_results = []
+    company_index = load_company_index()
+    dedup_index = DedupIndex(DEDUP_INDEX)
+    # Files ingested on earlier runs are skipped without being opened
+    manifest = ScanManifest(SCAN_MANIFEST, scope="ingest")
     
     for folder in FOLDERS:
         if os.path.exists(folder):
-            results = process_folder(folder)
+            if args.full:
+                manifest.forget(folder)
+            results = process_folder(folder, company_index, dedup_index, manifest)
             all_results.extend(results)
         else:
             print(f"\n❌ Folder not found: {folder}")
+    manifest.close()
     
     # Summary
     success = [r for r in all_results if r["status"] == "success"]
     failed = [r for r in all_results if r["status"] == "failed"]
     skipped = [r for r in all_results if r["status"] == "skipped"]
+    duplicates = [r for r in all_results if r["status"] == "duplicate"]
     
     print("\n" + "=" * 60)
     print("📊 SUMMARY")
@@ -303,12 +471,17 @@ def main():
     print(f"  ✅ Success:  {len(success)}")
     print(f"  ❌ Failed:   {len(failed)}")
     print(f"  ⏭️  Skipped:  {len(skipped)}")
+    print(f"  🔁 Duplicate: {len(duplicates)}")
     print(f"  📋 Total:    {len(all_results)}")
     
     if success:
         total_amount = sum(r["amount"] for r in success)
         print(f"\n  💰 Total Amount: RM {total_amount:,.2f}")
     
+    bytes_read = sum(r["io"]["bytes_read"] for r in all_results)
+    read_ms = sum(r["io"]["read_ms"] for r in all_results)
+    print(f"  💽 Disk reads: {bytes_read / 1024 / 1024:,.1f} MB in {read_ms / 1000:,.1f}s")
+    
     # Save results
     output_path = "/tmp/all_invoices_processed.json"
     with open(output_path, "w") as f:
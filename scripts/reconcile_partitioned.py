@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Partitioned parallel reconciliation across suppliers and periods
+Splits payments and invoices by supplier company and by month, runs the
+match_omni_payments matcher on each partition in a process pool, and
+merges the results deterministically.
+
+Partitioning:
+- A payment belongs to exactly one partition: (its company, its month)
+- A partition sees the company's invoices dated within its month widened by
+  OVERLAP_DAYS on each side, so matches across a month edge are still found
+
+Merging (always in sorted partition order, so runs are reproducible):
+- An invoice claimed by two partitions goes to the first; the other payment
+  is re-matched in a residual pass
+- The residual pass also retries unmatched payments against the company's
+  remaining invoices outside the window, so nothing the serial matcher
+  would find is lost
+
+Input JSON: {"payments": [...], "invoices": [...]} where payments have
+date, amount and companyId, and invoices have invoice_number,
+invoice_date, total_amount and companyId.
+
+Usage:
+    python reconcile_partitioned.py INPUT.json [--workers N] [--overlap-days 45]
+    python reconcile_partitioned.py --replica /tmp/invoice_flow_replica.sqlite   # see sync_replica.py
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime, timedelta
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from match_omni_payments import match_payments_to_invoices
+
+# Configuration
+OVERLAP_DAYS = 45
+OUTPUT_PATH = "/tmp/partitioned_reconciliation.json"
+NO_COMPANY = "__none__"
+
+
+def company_of(record: dict) -> str:
+    return record.get("companyId") or record.get("company_id") or NO_COMPANY
+
+
+def month_bounds(month: str) -> tuple:
+    start = datetime.strptime(month + "-01", "%Y-%m-%d")
+    end = (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return start, end
+
+
+def build_partitions(payments: list, invoices: list, overlap_days: int) -> dict:
+    """{(company, month): (payments, invoices)} with overlapping invoice windows"""
+    payments_by_key = defaultdict(list)
+    for p in payments:
+        payments_by_key[(company_of(p), p["date"][:7])].append(p)
+
+    invoices_by_company = defaultdict(list)
+    for inv in invoices:
+        if inv.get("invoice_date"):
+            invoices_by_company[company_of(inv)].append(inv)
+    invoice_dates = {}
+    for company, company_invoices in invoices_by_company.items():
+        company_invoices.sort(key=lambda inv: (inv["invoice_date"], inv["invoice_number"]))
+        invoice_dates[company] = [inv["invoice_date"] for inv in company_invoices]
+
+    partitions = {}
+    for (company, month), part_payments in payments_by_key.items():
+        start, end = month_bounds(month)
+        lo = (start - timedelta(days=overlap_days)).strftime("%Y-%m-%d")
+        hi = (end + timedelta(days=overlap_days)).strftime("%Y-%m-%d")
+        dates = invoice_dates.get(company, [])
+        window = invoices_by_company[company][bisect_left(dates, lo):bisect_right(dates, hi)] if dates else []
+        # Same order every run so the matcher's first-come choices are stable
+        part_payments.sort(key=lambda p: (p["date"], p["amount"], str(p.get("id", ""))))
+        partitions[(company, month)] = (part_payments, window)
+    return partitions
+
+
+def match_partition(item: tuple) -> tuple:
+    """Worker: run the serial matcher on one partition"""
+    key, (payments, invoices) = item
+    matches, unmatched = match_payments_to_invoices(payments, invoices)
+    unmatched_ids = {id(p) for p in unmatched}
+    # Matches come back in payment order, skipping the unmatched ones
+    matched_payments = [p for p in payments if id(p) not in unmatched_ids]
+    return key, list(zip(matched_payments, matches)), unmatched
+
+
+def reconcile(payments: list, invoices: list, workers: int = None, overlap_days: int = OVERLAP_DAYS) -> dict:
+    partitions = build_partitions(payments, invoices, overlap_days)
+    ordered = sorted(partitions.items())
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(match_partition, ordered, chunksize=max(1, len(ordered) // 64)))
+
+    # Deterministic merge: earlier partitions win contested invoices
+    claimed = set()
+    matches = []
+    residual = defaultdict(list)
+    for (company, _month), pairs, unmatched in results:
+        for payment, match in pairs:
+            invoice_key = (company, match["invoice_number"])
+            if invoice_key in claimed:
+                residual[company].append(payment)
+                continue
+            claimed.add(invoice_key)
+            matches.append(dict(match, company_id=company))
+        residual[company].extend(unmatched)
+
+    # Residual pass: contested + unmatched payments against every unclaimed invoice
+    invoices_by_company = defaultdict(list)
+    for inv in invoices:
+        company = company_of(inv)
+        if (company, inv["invoice_number"]) not in claimed and inv.get("invoice_date"):
+            invoices_by_company[company].append(inv)
+
+    unmatched_payments = []
+    residual_matches = 0
+    for company in sorted(residual):
+        pending = sorted(residual[company], key=lambda p: (p["date"], p["amount"], str(p.get("id", ""))))
+        extra, still_unmatched = match_payments_to_invoices(pending, invoices_by_company.get(company, []))
+        residual_matches += len(extra)
+        matches.extend(dict(m, company_id=company) for m in extra)
+        unmatched_payments.extend(dict(p, company_id=company) for p in still_unmatched)
+
+    matches.sort(key=lambda m: (m["company_id"], m["payment_date"], m["invoice_number"]))
+    unmatched_payments.sort(key=lambda p: (p["company_id"], p["date"], p["amount"]))
+
+    return {
+        "matches": matches,
+        "unmatched_payments": unmatched_payments,
+        "summary": {
+            "partitions": len(partitions),
+            "total_payments": len(payments),
+            "matched": len(matches),
+            "matched_in_residual_pass": residual_matches,
+            "unmatched": len(unmatched_payments),
+            "matched_amount": sum(m["payment_amount"] for m in matches),
+            "unmatched_amount": sum(p["amount"] for p in unmatched_payments),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Partitioned parallel reconciliation")
+    parser.add_argument("input", nargs="?", help='JSON with "payments" and "invoices"')
+    parser.add_argument("--replica", help="Read live data from a sync_replica.py SQLite replica")
+    parser.add_argument("--workers", type=int, default=None, help="Processes (default: CPU count)")
+    parser.add_argument("--overlap-days", type=int, default=OVERLAP_DAYS)
+    parser.add_argument("--out", default=OUTPUT_PATH)
+    args = parser.parse_args()
+
+    if args.replica:
+        from sync_replica import load_replica
+        payments, invoices = load_replica(args.replica)
+        data = {"payments": payments, "invoices": invoices}
+    elif args.input:
+        with open(args.input, encoding="utf-8") as f:
+            data = json.load(f)
+    else:
+        parser.error("give INPUT.json or --replica")
+
+    print("=" * 60)
+    print("📋 PARTITIONED RECONCILIATION")
+    print("=" * 60)
+    print(f"📊 Payments: {len(data['payments'])}")
+    print(f"📊 Invoices: {len(data['invoices'])}")
+
+    start = time.time()
+    output = reconcile(data["payments"], data["invoices"], args.workers, args.overlap_days)
+    summary = output["summary"]
+
+    print(f"\n🧩 Partitions: {summary['partitions']}")
+    print(f"  ✅ Matched:   {summary['matched']:>6} payments = RM {summary['matched_amount']:>16,.2f}")
+    print(f"  ❌ Unmatched: {summary['unmatched']:>6} payments = RM {summary['unmatched_amount']:>16,.2f}")
+    print(f"  🔁 Residual-pass matches: {summary['matched_in_residual_pass']}")
+    print(f"⏱️  {time.time() - start:.2f}s")
+
+    with open(args.out, "w") as f:
+        json.dump(output, f, indent=2)
+    print(f"\n💾 Mapping saved to: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
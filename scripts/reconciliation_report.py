@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Reconciliation reporting engine
+Loads payments/invoices into a columnar frame once and computes every
+summary (month, supplier, recipient, status, unmatched ageing,
+matched-vs-unmatched totals) as vectorized group-bys.
+
+Inputs (any mix, JSON):
+    - a payments export (list of payment objects, e.g. /api/payments/all)
+    - a matcher mapping (/tmp/omni_payment_invoice_mapping.json)
+
+Usage:
+    python reconciliation_report.py INPUT.json [INPUT.json ...]
+        [--as-of 2025-12-31] [--format csv|json|parquet] [--out DIR]
+"""
+
+import os
+import json
+import argparse
+from datetime import datetime
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:
+    print("❌ pandas not installed. Run: pip install pandas")
+    exit(1)
+
+# Configuration
+OUTPUT_DIR = "/tmp/reconciliation_report"
+AGEING_BINS = [-np.inf, 30, 60, 90, np.inf]
+AGEING_LABELS = ["0-30", "31-60", "61-90", "90+"]
+UNDATED = "undated"  # month / ageing bucket for rows with a missing or unparseable date
+COLUMNS = ["date", "amount", "supplier", "recipient", "invoice_number", "status"]
+
+
+def records_from_mapping(mapping: dict) -> list:
+    """Flatten a match_omni_payments mapping into payment rows"""
+    rows = []
+    for m in mapping.get("matches", []):
+        rows.append({
+            "date": m["payment_date"],
+            "amount": m["payment_amount"],
+            "supplier": m.get("supplier"),
+            "recipient": m.get("recipient"),
+            "invoice_number": m["invoice_number"],
+            "status": "matched",
+        })
+    for p in mapping.get("unmatched_payments", []):
+        rows.append({
+            "date": p["date"],
+            "amount": p["amount"],
+            "supplier": p.get("supplier"),
+            "recipient": p.get("recipient"),
+            "invoice_number": None,
+            "status": "unmatched",
+        })
+    return rows
+
+
+def records_from_payments(payments: list) -> list:
+    """Flatten API payment objects (with nested company/invoice) into rows"""
+    rows = []
+    for p in payments:
+        invoice = p.get("invoice") or {}
+        company = p.get("company") or {}
+        rows.append({
+            "date": p.get("date"),
+            "amount": p.get("amount"),
+            "supplier": company.get("name") or p.get("supplier"),
+            "recipient": invoice.get("recipientName") or p.get("recipient"),
+            "invoice_number": invoice.get("invoiceNumber"),
+            "status": "matched" if p.get("invoiceId") or invoice else "unmatched",
+        })
+    return rows
+
+
+def load_frame(paths: list) -> pd.DataFrame:
+    """Read every input once and build a single typed, columnar frame"""
+    rows = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict) and ("matches" in data or "unmatched_payments" in data):
+            rows.extend(records_from_mapping(data))
+        elif isinstance(data, list):
+            rows.extend(records_from_payments(data))
+        else:
+            print(f"⚠️ Unrecognised input skipped: {path}")
+
+    df = pd.DataFrame.from_records(rows, columns=COLUMNS)
+    # ISO8601 parses each value on its own: mappings use YYYY-MM-DD, exports full timestamps
+    df["date"] = pd.to_datetime(df["date"], utc=True, errors="coerce", format="ISO8601").dt.tz_localize(None)
+    df["amount"] = pd.to_numeric(df["amount"], errors="coerce").fillna(0.0)
+    for col in ("supplier", "recipient", "status"):
+        df[col] = df[col].fillna("N/A").astype("category")
+    df["month"] = df["date"].dt.to_period("M").astype(str).where(df["date"].notna(), UNDATED)
+    return df
+
+
+def build_report(df: pd.DataFrame, as_of: datetime) -> dict:
+    """Compute all summary tables; each is one vectorized pass over the frame"""
+    agg = {"count": ("amount", "size"), "amount": ("amount", "sum")}
+
+    totals = df.groupby("status", observed=True).agg(**agg).reset_index()
+
+    by_month = (
+        df.pivot_table(index="month", columns="status", values="amount",
+                       aggfunc=["size", "sum"], fill_value=0, observed=True)
+    )
+    by_month.columns = [f"{'count' if fn == 'size' else 'amount'}_{status}" for fn, status in by_month.columns]
+    by_month = by_month.reset_index()
+
+    by_supplier = df.groupby(["supplier", "status"], observed=True).agg(**agg).reset_index()
+    by_recipient = df.groupby(["recipient", "status"], observed=True).agg(**agg).reset_index()
+
+    unmatched = df[df["status"] == "unmatched"]
+    age_days = (pd.Timestamp(as_of) - unmatched["date"]).dt.days
+    # Undated rows get their own bucket so the ageing table sums to the unmatched total
+    buckets = pd.cut(age_days, bins=AGEING_BINS, labels=AGEING_LABELS).cat.add_categories(UNDATED)
+    ageing = (
+        unmatched.assign(bucket=buckets.fillna(UNDATED))
+        .groupby("bucket", observed=False)
+        .agg(**agg)
+        .reset_index()
+    )
+
+    return {
+        "totals": totals,
+        "by_month": by_month,
+        "by_supplier": by_supplier,
+        "by_recipient": by_recipient,
+        "unmatched_ageing": ageing,
+    }
+
+
+def export_report(report: dict, out_dir: str, fmt: str) -> list:
+    """Write one file per table in the chosen format"""
+    os.makedirs(out_dir, exist_ok=True)
+    written = []
+    for name, table in report.items():
+        path = os.path.join(out_dir, f"{name}.{fmt}")
+        if fmt == "csv":
+            table.to_csv(path, index=False)
+        elif fmt == "json":
+            table.to_json(path, orient="records", indent=2)
+        elif fmt == "parquet":
+            # Needs pyarrow or fastparquet
+            table.to_parquet(path, index=False)
+        written.append(path)
+    return written
+
+
+def print_report(report: dict):
+    totals = report["totals"].set_index("status")
+    matched = totals["amount"].get("matched", 0.0)
+    unmatched = totals["amount"].get("unmatched", 0.0)
+
+    print("=" * 60)
+    print("📊 RECONCILIATION SUMMARY")
+    print("=" * 60)
+    print(f"  ✅ Matched:   {int(totals['count'].get('matched', 0)):>7} payments = RM {matched:>16,.2f}")
+    print(f"  ❌ Unmatched: {int(totals['count'].get('unmatched', 0)):>7} payments = RM {unmatched:>16,.2f}")
+    print(f"  📋 Total:     {int(totals['count'].sum()):>7} payments = RM {matched + unmatched:>16,.2f}")
+    print()
+    print("⏳ Unmatched ageing (days)")
+    for row in report["unmatched_ageing"].itertuples():
+        print(f"  {row.bucket:<8} {row.count:>7}  RM {row.amount:>16,.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar reconciliation reports")
+    parser.add_argument("inputs", nargs="+", help="Payments export or matcher mapping JSON")
+    parser.add_argument("--as-of", default=datetime.now().strftime("%Y-%m-%d"))
+    parser.add_argument("--format", choices=["csv", "json", "parquet"], default="csv")
+    parser.add_argument("--out", default=OUTPUT_DIR)
+    args = parser.parse_args()
+
+    df = load_frame(args.inputs)
+    print(f"📥 Loaded {len(df):,} payments")
+    undated = int(df["date"].isna().sum())
+    if undated:
+        print(f"⚠️ {undated:,} payments have no usable date; reported under \"{UNDATED}\"")
+
+    report = build_report(df, datetime.strptime(args.as_of, "%Y-%m-%d"))
+    print_report(report)
+
+    written = export_report(report, args.out, args.format)
+    print(f"\n💾 {len(written)} tables saved to: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
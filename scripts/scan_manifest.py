@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Stat-based change detection for invoice folders
+Remembers (size, mtime, inode) of every PDF a stage has handled, so a rescan
+is one os.scandir pass plus one SQLite read per folder. Only new or modified
+files go on to the expensive stages; nothing is opened or hashed.
+
+- new:       path not seen before
+- modified:  same path, different size, mtime or inode (replaced in place)
+- renamed:   a vanished path and a new path share (device, inode, size, mtime);
+             the entry and its stored result move to the new name. A rename
+             keeps mtime, while a new file that reuses a freed inode does not
+- deleted:   vanished and not renamed; dropped from the manifest
+
+A file is only recorded once its stage reports it done (record()), so a
+crash or a failed file is simply picked up again on the next run.
+Each stage uses its own scope: extracting a file doesn't mean it was ingested.
+
+Usage:
+    python scan_manifest.py FOLDER [FOLDER ...] [--scope ingest]   # show what would be processed
+"""
+
+import os
+import json
+import time
+import sqlite3
+import argparse
+from datetime import datetime
+
+# Configuration
+SCAN_MANIFEST = os.environ.get("INVOICE_SCAN_MANIFEST", "/tmp/invoice_scan_manifest.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    scope        TEXT NOT NULL,
+    folder       TEXT NOT NULL,
+    path         TEXT NOT NULL,
+    size         INTEGER NOT NULL,
+    mtime_ns     INTEGER NOT NULL,
+    inode        INTEGER NOT NULL,
+    device       INTEGER NOT NULL,
+    result       TEXT,
+    recorded_at  TEXT,
+    PRIMARY KEY (scope, path)
+);
+CREATE INDEX IF NOT EXISTS idx_files_folder ON files(scope, folder);
+"""
+
+
+class ScanResult:
+    """Outcome of one folder scan; `pending` is what needs processing"""
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.new = []
+        self.modified = []
+        self.renamed = []     # (old path, new path)
+        self.deleted = []
+        self.unchanged = []
+        self.seconds = 0.0
+
+    @property
+    def pending(self) -> list:
+        return sorted(self.new + self.modified)
+
+    @property
+    def total(self) -> int:
+        return len(self.new) + len(self.modified) + len(self.renamed) + len(self.unchanged)
+
+    def describe(self) -> str:
+        return (f"{len(self.new)} new, {len(self.modified)} modified, {len(self.renamed)} renamed, "
+                f"{len(self.deleted)} deleted, {len(self.unchanged)} unchanged ({self.seconds * 1000:.0f} ms)")
+
+
+class ScanManifest:
+    """Persistent per-scope record of files already handled"""
+
+    def __init__(self, path: str = SCAN_MANIFEST, scope: str = "default"):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+        self.scope = scope
+        self._stats = {}
+
+    def scan(self, folder: str, suffix: str = ".pdf") -> ScanResult:
+        """Compare the folder against the manifest; renames and deletes are applied immediately"""
+        start = time.perf_counter()
+        folder = os.path.abspath(folder)
+        result = ScanResult(folder)
+
+        known = {
+            path: (size, mtime_ns, inode, device)
+            for path, size, mtime_ns, inode, device in self.conn.execute(
+                "SELECT path, size, mtime_ns, inode, device FROM files WHERE scope = ? AND folder = ?",
+                (self.scope, folder),
+            )
+        }
+
+        current = {}
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if not entry.name.endswith(suffix) or not entry.is_file():
+                    continue
+                st = entry.stat()
+                current[entry.path] = (st.st_size, st.st_mtime_ns, st.st_ino, st.st_dev)
+
+        appeared = []
+        for path, stat in current.items():
+            previous = known.get(path)
+            if previous is None:
+                appeared.append(path)
+            elif previous != stat:
+                result.modified.append(path)
+            else:
+                result.unchanged.append(path)
+
+        vanished = [path for path in known if path not in current]
+        # Inode 0 means the filesystem has no stable inodes (some network mounts)
+        by_identity = {
+            (known[path][3], known[path][2], known[path][0], known[path][1]): path
+            for path in vanished if known[path][2]
+        }
+
+        for path in appeared:
+            size, mtime_ns, inode, device = current[path]
+            old_path = by_identity.pop((device, inode, size, mtime_ns), None) if inode else None
+            if old_path is None:
+                result.new.append(path)
+                continue
+            result.renamed.append((old_path, path))
+            vanished.remove(old_path)
+
+        with self.conn:
+            for old_path, new_path in result.renamed:
+                size, mtime_ns, inode, device = current[new_path]
+                self.conn.execute(
+                    "UPDATE files SET path = ?, size = ?, mtime_ns = ?, inode = ?, device = ? "
+                    "WHERE scope = ? AND path = ?",
+                    (new_path, size, mtime_ns, inode, device, self.scope, old_path),
+                )
+            self.conn.executemany(
+                "DELETE FROM files WHERE scope = ? AND path = ?", [(self.scope, p) for p in vanished]
+            )
+        result.deleted = sorted(vanished)
+
+        # Kept so record() stores exactly what this scan saw
+        self._stats.update((path, current[path]) for path in result.new + result.modified)
+        result.seconds = time.perf_counter() - start
+        return result
+
+    def record(self, path: str, result=None):
+        """Mark a pending file as done, optionally storing its (JSON-serializable) result"""
+        path = os.path.abspath(str(path))
+        stat = self._stats.pop(path, None)
+        if stat is None:
+            st = os.stat(path)
+            stat = (st.st_size, st.st_mtime_ns, st.st_ino, st.st_dev)
+        size, mtime_ns, inode, device = stat
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files "
+                "(scope, folder, path, size, mtime_ns, inode, device, result, recorded_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.scope, os.path.dirname(path), path, size, mtime_ns, inode, device,
+                 json.dumps(result) if result is not None else None,
+                 datetime.now().isoformat(timespec="seconds")),
+            )
+
+    def results(self, paths: list) -> dict:
+        """{path: stored result} for already-recorded files (one query per folder)"""
+        wanted = set(paths)
+        stored = {}
+        for folder in {os.path.dirname(p) for p in wanted}:
+            for path, result in self.conn.execute(
+                "SELECT path, result FROM files WHERE scope = ? AND folder = ? AND result IS NOT NULL",
+                (self.scope, folder),
+            ):
+                if path in wanted:
+                    stored[path] = json.loads(result)
+        return stored
+
+    def forget(self, folder: str = None):
+        """Drop entries (one folder or the whole scope) to force a full reprocess"""
+        with self.conn:
+            if folder:
+                self.conn.execute("DELETE FROM files WHERE scope = ? AND folder = ?",
+                                  (self.scope, os.path.abspath(folder)))
+            else:
+                self.conn.execute("DELETE FROM files WHERE scope = ?", (self.scope,))
+
+    def close(self):
+        self.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show which PDFs a stage would process")
+    parser.add_argument("folders", nargs="+")
+    parser.add_argument("--scope", default="ingest", help="extract (extract_invoices) or ingest (process_all_invoices)")
+    parser.add_argument("--manifest", default=SCAN_MANIFEST)
+    args = parser.parse_args()
+
+    manifest = ScanManifest(args.manifest, args.scope)
+    for folder in args.folders:
+        result = manifest.scan(folder)
+        print(f"📂 {folder}: {result.describe()}")
+        for path in result.pending:
+            print(f"   • {os.path.basename(path)}")
+    manifest.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Incremental sync of payments and invoices into a local SQLite replica
+Pages through GET /api/payments/all and GET /api/invoices with
+?updatedSince=&cursor=&limit= and upserts rows by id, so each run only
+transfers what changed since the last one.
+
+- The watermark (newest updatedAt seen) is committed with every page, so an
+  interrupted run resumes where it stopped
+- Each run re-reads OVERLAP_SECONDS before the watermark to pick up rows
+  whose transaction committed late; upserts make the overlap harmless
+- Deletes are not visible in a delta: --full re-reads everything and drops
+  rows the API no longer returns
+
+The matchers read the replica with load_replica():
+    python match_omni_payments.py --replica /tmp/invoice_flow_replica.sqlite --company ID
+    python reconcile_partitioned.py --replica /tmp/invoice_flow_replica.sqlite
+
+Usage:
+    python sync_replica.py [--full] [--replica PATH] [--page-size 500]
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+from datetime import datetime, timedelta, timezone
+
+import requests
+
+# Configuration (API_KEY / BASE_URL come from process_all_invoices, see main())
+REPLICA_PATH = os.environ.get("INVOICE_FLOW_REPLICA", "/tmp/invoice_flow_replica.sqlite")
+PAGE_SIZE = 500
+OVERLAP_SECONDS = 120
+MAX_RETRIES = 5
+
+# resource -> (endpoint, columns extracted from each row for querying)
+RESOURCES = {
+    "payments": ("/payments/all", {
+        "company_id": "companyId",
+        "invoice_id": "invoiceId",
+        "amount": "amount",
+        "date": "date",
+    }),
+    "invoices": ("/invoices", {
+        "company_id": "companyId",
+        "invoice_number": "invoiceNumber",
+        "invoice_date": "invoiceDate",
+        "total_amount": "totalAmount",
+        "status": "status",
+    }),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS payments (
+    id          TEXT PRIMARY KEY,
+    updated_at  TEXT NOT NULL,
+    company_id  TEXT,
+    invoice_id  TEXT,
+    amount      REAL,
+    date        TEXT,
+    data        TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_payments_company ON payments(company_id);
+CREATE TABLE IF NOT EXISTS invoices (
+    id             TEXT PRIMARY KEY,
+    updated_at     TEXT NOT NULL,
+    company_id     TEXT,
+    invoice_number TEXT,
+    invoice_date   TEXT,
+    total_amount   REAL,
+    status         TEXT,
+    data           TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_invoices_company ON invoices(company_id);
+CREATE TABLE IF NOT EXISTS sync_state (
+    resource   TEXT PRIMARY KEY,
+    watermark  TEXT,
+    synced_at  TEXT
+);
+"""
+
+
+def open_replica(path: str = REPLICA_PATH) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def get_watermark(conn, resource: str):
+    row = conn.execute("SELECT watermark FROM sync_state WHERE resource = ?", (resource,)).fetchone()
+    return row[0] if row else None
+
+
+def overlap_start(watermark: str) -> str:
+    """Watermark moved back by OVERLAP_SECONDS, in the API's timestamp format"""
+    ts = datetime.fromisoformat(watermark.replace("Z", "+00:00")) - timedelta(seconds=OVERLAP_SECONDS)
+    return ts.astimezone(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def fetch_page(session: requests.Session, url: str, params: dict):
+    """One page, retrying throttling and server errors with backoff"""
+    for attempt in range(MAX_RETRIES):
+        try:
+            response = session.get(url, params=params, timeout=60)
+        except requests.RequestException as e:
+            if attempt == MAX_RETRIES - 1:
+                raise
+            print(f"   ⚠️ {e}, retrying")
+        else:
+            if response.status_code == 429 or response.status_code >= 500:
+                if attempt == MAX_RETRIES - 1:
+                    response.raise_for_status()
+            else:
+                response.raise_for_status()
+                return response.json()
+        time.sleep(min(2 ** attempt, 30))
+
+
+def upsert_rows(conn, resource: str, rows: list):
+    columns = RESOURCES[resource][1]
+    names = ["id", "updated_at", *columns, "data"]
+    updates = ", ".join(f"{n} = excluded.{n}" for n in names[1:])
+    conn.executemany(
+        f"INSERT INTO {resource} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))}) "
+        f"ON CONFLICT(id) DO UPDATE SET {updates}",
+        [
+            (row["id"], row["updatedAt"], *(row.get(field) for field in columns.values()), json.dumps(row))
+            for row in rows
+        ],
+    )
+
+
+def sync_resource(conn, session: requests.Session, base_url: str, resource: str, full: bool = False,
+                  page_size: int = PAGE_SIZE) -> dict:
+    """Pull the delta for one resource from the API at base_url; returns counters for the summary"""
+    endpoint = RESOURCES[resource][0]
+    watermark = None if full else get_watermark(conn, resource)
+    params = {"limit": page_size}
+    if watermark:
+        params["updatedSince"] = overlap_start(watermark)
+
+    if full:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS seen_ids (id TEXT PRIMARY KEY)")
+        conn.execute("DELETE FROM seen_ids")
+
+    stats = {"pages": 0, "rows": 0, "deleted": 0}
+    while True:
+        body = fetch_page(session, f"{base_url}{endpoint}", params)
+        if isinstance(body, list):
+            # Server without paging support: this is the whole table
+            rows, next_cursor = body, None
+            if not full:
+                print(f"   ⚠️ {endpoint} returned an unpaged list; treating it as a full snapshot")
+        else:
+            rows, next_cursor = body["data"], body["nextCursor"]
+
+        with conn:
+            upsert_rows(conn, resource, rows)
+            if full:
+                conn.executemany("INSERT OR IGNORE INTO seen_ids (id) VALUES (?)", [(r["id"],) for r in rows])
+            newest = max((r["updatedAt"] for r in rows), default=None)
+            if newest and (watermark is None or newest > watermark):
+                watermark = newest
+            conn.execute(
+                "INSERT INTO sync_state (resource, watermark, synced_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(resource) DO UPDATE SET watermark = excluded.watermark, synced_at = excluded.synced_at",
+                (resource, watermark, datetime.now().isoformat(timespec="seconds")),
+            )
+        stats["pages"] += 1
+        stats["rows"] += len(rows)
+
+        if not next_cursor:
+            break
+        params["cursor"] = next_cursor
+
+    if full:
+        with conn:
+            cur = conn.execute(f"DELETE FROM {resource} WHERE id NOT IN (SELECT id FROM seen_ids)")
+            stats["deleted"] = cur.rowcount
+    return stats
+
+
+def load_replica(path: str = REPLICA_PATH, company_id: str = None) -> tuple:
+    """(payments awaiting invoices, invoices) in the matchers' input format"""
+    conn = open_replica(path)
+    try:
+        company_filter = " AND company_id = ?" if company_id else ""
+        args = (company_id,) if company_id else ()
+        payments = [
+            {"id": pid, "date": date[:10], "amount": amount, "companyId": company}
+            for pid, date, amount, company in conn.execute(
+                "SELECT id, date, amount, company_id FROM payments "
+                "WHERE invoice_id IS NULL AND date IS NOT NULL" + company_filter + " ORDER BY date, id",
+                args,
+            )
+        ]
+        invoices = [
+            {"invoice_number": number, "invoice_date": date[:10], "total_amount": amount, "companyId": company}
+            for number, date, amount, company in conn.execute(
+                "SELECT invoice_number, invoice_date, total_amount, company_id FROM invoices "
+                "WHERE invoice_number IS NOT NULL AND invoice_date IS NOT NULL" + company_filter +
+                " ORDER BY invoice_date, invoice_number",
+                args,
+            )
+        ]
+    finally:
+        conn.close()
+    return payments, invoices
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental sync into a local SQLite replica")
+    parser.add_argument("--replica", default=REPLICA_PATH)
+    parser.add_argument("--full", action="store_true", help="Re-read everything and drop deleted rows")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    parser.add_argument("--only", choices=sorted(RESOURCES), help="Sync a single resource")
+    args = parser.parse_args()
+
+    # Imported here, not at the top, so the matchers can use load_replica()
+    # without the extraction dependencies process_all_invoices pulls in
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from process_all_invoices import API_KEY, BASE_URL
+
+    print("=" * 60)
+    print("🔄 REPLICA SYNC" + (" (full)" if args.full else ""))
+    print("=" * 60)
+
+    session = requests.Session()
+    session.headers["X-API-Key"] = API_KEY
+    conn = open_replica(args.replica)
+    try:
+        for resource in ([args.only] if args.only else RESOURCES):
+            start = time.time()
+            since = None if args.full else get_watermark(conn, resource)
+            stats = sync_resource(conn, session, BASE_URL, resource, args.full, args.page_size)
+            total = conn.execute(f"SELECT COUNT(*) FROM {resource}").fetchone()[0]
+            print(f"📥 {resource}: {stats['rows']} changed rows in {stats['pages']} pages "
+                  f"({time.time() - start:.2f}s) since {since or 'the beginning'}")
+            if stats["deleted"]:
+                print(f"   🗑️ Removed {stats['deleted']} rows no longer in the API")
+            print(f"   📋 Replica now holds {total} {resource}")
+    finally:
+        conn.close()
+
+    print(f"\n💾 Replica: {args.replica}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ import { authenticateRequest } from "@/lib/api-auth";
 import { prisma } from "@/lib/prisma";
 import { uploadFile, generateFileKey } from "@/lib/storage";
 import { extractInvoiceData } from "@/lib/ocr";
+import { parseSyncParams, toSyncPage } from "@/lib/sync-cursor";
 
 export async function GET(request: NextRequest) {
   // Try API key authentication first, then session
@@ -23,6 +24,12 @@ export async function GET(request: NextRequest) {
   const { searchParams } = new URL(request.url);
   const status = searchParams.get("status");
 
+  // Incremental sync: ?updatedSince=&cursor=&limit= returns { data, nextCursor }
+  const sync = parseSyncParams(searchParams);
+  if (sync && "error" in sync) {
+    return NextResponse.json({ error: sync.error }, { status: 400 });
+  }
+
   try {
     let whereClause: Record<string, unknown> = {};
 
@@ -81,6 +88,9 @@ export async function GET(request: NextRequest) {
     if (status) {
       whereClause.status = status;
     }
+    if (sync) {
+      Object.assign(whereClause, sync.where);
+    }
 
     const invoices = await prisma.invoice.findMany({
       where: whereClause,
@@ -111,9 +121,14 @@ export async function GET(request: NextRequest) {
           orderBy: { date: "desc" },
         },
       },
-      orderBy: { createdAt: "desc" },
+      ...(sync
+        ? { orderBy: sync.orderBy, take: sync.take + 1 }
+        : { orderBy: { createdAt: "desc" as const } }),
     });
 
+    if (sync) {
+      return NextResponse.json(toSyncPage(invoices, sync.take));
+    }
     return NextResponse.json(invoices);
   } catch (error) {
     console.error("Error fetching invoices:", error);
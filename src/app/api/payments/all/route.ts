@@ -1,16 +1,25 @@
 import { NextRequest, NextResponse } from "next/server";
-import { auth, hasAnyRole } from "@/lib/auth";
+import { authenticateRequest } from "@/lib/api-auth";
 import { prisma } from "@/lib/prisma";
+import { parseSyncParams, toSyncPage } from "@/lib/sync-cursor";
 
 // GET - Fetch all payments (for business users to see and settle)
+// With ?updatedSince=&cursor=&limit= returns { data, nextCursor } pages
+// ordered by (updatedAt, id) for incremental sync; otherwise the full list
 export async function GET(request: NextRequest) {
-  const session = await auth();
+  // Session for the dashboard, X-API-Key for sync scripts
+  const authResult = await authenticateRequest(request);
 
-  if (!session?.user?.id) {
+  if (!authResult) {
     return NextResponse.json({ error: "Unauthorized" }, { status: 401 });
   }
 
-  const userRoles = session.user.roles || [];
+  const sync = parseSyncParams(new URL(request.url).searchParams);
+  if (sync && "error" in sync) {
+    return NextResponse.json({ error: sync.error }, { status: 400 });
+  }
+
+  const userRoles = authResult.user.roles || [];
   const isAdmin = userRoles.includes("ADMIN");
   const isBusiness = userRoles.includes("BUSINESS");
 
@@ -29,7 +38,7 @@ export async function GET(request: NextRequest) {
     if (isBusiness && !isAdmin) {
       // Get user's company
       const user = await prisma.user.findUnique({
-        where: { id: session.user.id },
+        where: { id: authResult.userId },
         select: { companyId: true },
       });
 
@@ -48,6 +57,9 @@ export async function GET(request: NextRequest) {
     if (accessibleCompanyIds !== null) {
       where.companyId = { in: accessibleCompanyIds };
     }
+    if (sync) {
+      Object.assign(where, sync.where);
+    }
 
     const payments = await prisma.payment.findMany({
       where,
@@ -59,6 +71,7 @@ export async function GET(request: NextRequest) {
         invoiceId: true,
         settledAmount: true,
         createdAt: true,
+        updatedAt: true,
         companyId: true,
         company: {
           select: {
@@ -100,9 +113,14 @@ export async function GET(request: NextRequest) {
           },
         },
       },
-      orderBy: { date: "desc" },
+      ...(sync
+        ? { orderBy: sync.orderBy, take: sync.take + 1 }
+        : { orderBy: { date: "desc" as const } }),
     });
 
+    if (sync) {
+      return NextResponse.json(toSyncPage(payments, sync.take));
+    }
     return NextResponse.json(payments);
   } catch (error) {
     console.error("Error fetching all payments:", error);
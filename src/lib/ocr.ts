@@ -20,6 +20,12 @@ export async function extractInvoiceData(
   console.log("📋 MIME Type:", mimeType);
   console.log("📦 Buffer Size:", fileBuffer.length, "bytes");
 
+  // Prefer the warm Python extraction service when it is configured
+  if (process.env.EXTRACTION_SERVICE_URL) {
+    const serviceResult = await extractWithService(fileBuffer, mimeType, fileName);
+    if (serviceResult) return serviceResult;
+  }
+
   // Handle PDF files - extract text using pdf-parse v1
   if (mimeType === "application/pdf") {
     console.log("📑 PDF detected - extracting text with pdf-parse...");
@@ -63,6 +69,59 @@ export async function extractInvoiceData(
   return extractFromFileName(fileName);
 }
 
+// Must outlast the service's worst case so its 503/504 arrives before we give up:
+// queue wait (10s) + worker restart (up to 60s) + --time-budget (30s)
+const EXTRACTION_SERVICE_TIMEOUT_MS =
+  Number(process.env.EXTRACTION_SERVICE_TIMEOUT_MS) || 120000;
+
+// Call scripts/extraction_service.py; returns null so callers fall back to local OCR
+async function extractWithService(
+  fileBuffer: Buffer,
+  mimeType: string,
+  fileName: string
+): Promise<OCRResult | null> {
+  const baseUrl = process.env.EXTRACTION_SERVICE_URL;
+  console.log("🐍 Sending to extraction service...");
+
+  try {
+    const response = await fetch(
+      `${baseUrl}/extract?filename=${encodeURIComponent(fileName)}`,
+      {
+        method: "POST",
+        headers: { "Content-Type": mimeType },
+        body: new Uint8Array(fileBuffer),
+        signal: AbortSignal.timeout(EXTRACTION_SERVICE_TIMEOUT_MS),
+      }
+    );
+
+    if (!response.ok) {
+      console.log("⚠️ Extraction service error:", response.status);
+      return null;
+    }
+
+    const data = await response.json();
+    let invoiceDate: Date | null = null;
+    if (data.invoice_date) {
+      const parsed = new Date(data.invoice_date);
+      if (!isNaN(parsed.getTime())) invoiceDate = parsed;
+    }
+
+    const result: OCRResult = {
+      invoiceNumber: data.invoice_number || null,
+      invoiceDate,
+      recipientName: data.recipient_name || null,
+      totalAmount: typeof data.total_amount === "number" ? data.total_amount : null,
+      rawText: data.raw_text || "",
+    };
+
+    console.log("✅ Extraction service result:", result.invoiceNumber || "NO INVOICE #");
+    return result;
+  } catch (error) {
+    console.log("⚠️ Extraction service unavailable:", error);
+    return null;
+  }
+}
+
 // Process image buffer with Google Vision API
 async function processImageWithVision(
   imageBuffer: Buffer,
@@ -0,0 +1,100 @@
+/**
+ * Keyset pagination for incremental sync (scripts/sync_replica.py)
+ *
+ * Rows are ordered by (updatedAt, id). The cursor is the position of the
+ * last row of a page, so every page is an index range scan no matter how
+ * deep the client is, and rows changed while paging simply show up later.
+ */
+
+export const DEFAULT_PAGE_SIZE = 500;
+export const MAX_PAGE_SIZE = 2000;
+
+export interface SyncPage {
+  take: number;
+  where: Record<string, unknown>;
+  orderBy: Record<string, "asc">[];
+}
+
+interface CursorPosition {
+  updatedAt: Date;
+  id: string;
+}
+
+export function encodeCursor(row: { updatedAt: Date; id: string }): string {
+  return Buffer.from(`${row.updatedAt.toISOString()}|${row.id}`).toString("base64url");
+}
+
+function decodeCursor(cursor: string): CursorPosition | null {
+  const [timestamp, id] = Buffer.from(cursor, "base64url").toString("utf8").split("|");
+  const updatedAt = new Date(timestamp);
+  if (!id || isNaN(updatedAt.getTime())) {
+    return null;
+  }
+  return { updatedAt, id };
+}
+
+/**
+ * Read cursor/updatedSince/limit from the query string.
+ * Returns null when none are present (callers keep their legacy response),
+ * or { error } when one is malformed.
+ */
+export function parseSyncParams(
+  searchParams: URLSearchParams
+): SyncPage | { error: string } | null {
+  const cursor = searchParams.get("cursor");
+  const updatedSince = searchParams.get("updatedSince");
+  const limit = searchParams.get("limit");
+
+  if (cursor === null && updatedSince === null && limit === null) {
+    return null;
+  }
+
+  const take = limit === null ? DEFAULT_PAGE_SIZE : parseInt(limit, 10);
+  if (isNaN(take) || take < 1) {
+    return { error: "limit must be a positive integer" };
+  }
+
+  const conditions: Record<string, unknown>[] = [];
+
+  if (updatedSince !== null) {
+    const since = new Date(updatedSince);
+    if (isNaN(since.getTime())) {
+      return { error: "updatedSince must be an ISO 8601 timestamp" };
+    }
+    conditions.push({ updatedAt: { gte: since } });
+  }
+
+  if (cursor !== null) {
+    const position = decodeCursor(cursor);
+    if (!position) {
+      return { error: "Invalid cursor" };
+    }
+    conditions.push({
+      OR: [
+        { updatedAt: { gt: position.updatedAt } },
+        { updatedAt: position.updatedAt, id: { gt: position.id } },
+      ],
+    });
+  }
+
+  return {
+    take: Math.min(take, MAX_PAGE_SIZE),
+    where: conditions.length > 0 ? { AND: conditions } : {},
+    orderBy: [{ updatedAt: "asc" }, { id: "asc" }],
+  };
+}
+
+/**
+ * Trim the extra row fetched to detect another page and build the response body
+ */
+export function toSyncPage<T extends { updatedAt: Date; id: string }>(
+  rows: T[],
+  take: number
+): { data: T[]; nextCursor: string | null } {
+  const hasMore = rows.length > take;
+  const data = hasMore ? rows.slice(0, take) : rows;
+  return {
+    data,
+    nextCursor: hasMore ? encodeCursor(data[data.length - 1]) : null,
+  };
+}